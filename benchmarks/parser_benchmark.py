@@ -0,0 +1,168 @@
+"""Parser microbenchmark over the recorded class detail pages in benchmarks/pages.
+
+Times process and its lookup helpers (safe_find, get_data_label) on BeautifulSoup trees built by each backend,
+alongside the lxml-only process_fast path. Every case also reports allocations from tracemalloc and is checked
+against pages/expected.json. Results print as a table; --json writes them in machine-readable form, and
+--baseline compares against an earlier --json file, exiting non-zero on regressions.
+
+    python benchmarks/parser_benchmark.py --json results.json
+    python benchmarks/parser_benchmark.py --baseline results.json --threshold 1.25
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PAGES_DIR = Path(__file__).resolve().parent/"pages"
+sys.path.insert(0, str(ROOT_DIR/"src"))
+
+import bs4
+import lxml.etree
+from bs4 import BeautifulSoup
+from cuny_search.processor import get_data_label, process, process_fast, safe_find
+
+BACKENDS = ("lxml", "html.parser")
+
+
+def load_corpus() -> dict[str, str]:
+    return {path.name: path.read_text() for path in sorted(PAGES_DIR.glob("*.html"))}
+
+
+def as_expected(result: tuple) -> dict[str, dict]:
+    details, availabilities = result
+    return {"details": asdict(details), "availabilities": asdict(availabilities)}
+
+
+def measure(fn: Callable[[], Any], repeat: int, number: int) -> dict[str, float]:
+    timings = [t/number for t in timeit.repeat(fn, repeat=repeat, number=number)]
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    median = statistics.median(timings)
+    return {
+        "min_us": round(min(timings)*1e6, 2),
+        "median_us": round(median*1e6, 2),
+        "ops_per_second": round(1/median, 1),
+        "peak_bytes": peak,
+        "allocations": allocations,
+    }
+
+
+def cases(html: str) -> dict[str, Callable[[], Any]]:
+    # Each helper runs against a prebuilt tree, so its time excludes tree construction
+    benchmarks: dict[str, Callable[[], Any]] = {}
+    for backend in BACKENDS:
+        soup = BeautifulSoup(html, backend)
+        benchmarks[f"{backend}/build"] = lambda backend=backend: BeautifulSoup(html, backend)
+        benchmarks[f"{backend}/process"] = lambda soup=soup: process(soup)
+        benchmarks[f"{backend}/safe_find"] = lambda soup=soup: safe_find(soup, "div", attrs={"class": "shadowbox"})
+        benchmarks[f"{backend}/get_data_label"] = lambda soup=soup: get_data_label(soup, "Instructor")
+        benchmarks[f"{backend}/end_to_end"] = lambda backend=backend: process(BeautifulSoup(html, backend))
+    benchmarks["fast/end_to_end"] = lambda: process_fast(html)
+    return benchmarks
+
+
+def check_results(corpus: dict[str, str]) -> list[str]:
+    expected = json.loads((PAGES_DIR/"expected.json").read_text())
+    mismatches: list[str] = []
+    for name, html in corpus.items():
+        parsers = {backend: (lambda backend=backend: process(BeautifulSoup(html, backend))) for backend in BACKENDS}
+        parsers["fast"] = lambda: process_fast(html)
+        for parser_name, parse in parsers.items():
+            if as_expected(parse()) != expected.get(name):
+                mismatches.append(f"{name} ({parser_name})")
+    return mismatches
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    previous = {(r["page"], r["case"]): r["median_us"] for r in baseline["results"]}
+    regressions: list[str] = []
+    for result in results:
+        before = previous.get((result["page"], result["case"]))
+        if before and result["median_us"] > before*threshold:
+            regressions.append(
+                f"{result['page']} {result['case']}: {before:.1f}us -> {result['median_us']:.1f}us "
+                f"({result['median_us']/before:.2f}x)"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    parser.add_argument("--baseline", type=Path, help="earlier --json output to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    mismatches = check_results(corpus)
+    if mismatches:
+        sys.exit(f"Parsed results differ from pages/expected.json: {', '.join(mismatches)}")
+
+    results: list[dict] = []
+    for name, html in corpus.items():
+        for case, fn in cases(html).items():
+            results.append({"page": name, "case": case, "bytes": len(html), **measure(fn, args.repeat, args.number)})
+
+    print(f"{'page':<24}{'case':<28}{'median us':>11}{'ops/s':>11}{'peak KiB':>10}{'allocs':>9}")
+    for r in results:
+        print(
+            f"{r['page']:<24}{r['case']:<28}{r['median_us']:>11.1f}{r['ops_per_second']:>11.0f}"
+            f"{r['peak_bytes']/1024:>10.1f}{r['allocations']:>9}"
+        )
+
+    # Throughput over the whole corpus, tree construction included
+    print()
+    for case in sorted({r["case"] for r in results if r["case"].endswith("end_to_end")}):
+        total = sum(r["median_us"] for r in results if r["case"] == case)
+        print(f"{case:<28}{len(corpus)/total*1e6:>10.0f} pages/s")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "timestamp": time.time(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "bs4": bs4.__version__,
+            "lxml": ".".join(map(str, lxml.etree.LXML_VERSION)),
+            "repeat": args.repeat,
+            "number": args.number,
+            "results": results,
+        }, indent=4) + "\n")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
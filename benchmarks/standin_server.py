@@ -0,0 +1,225 @@
+"""Local stand-in for the Global Search CFSearchToolController.
+
+Speaks the same protocol as refresh_client/fetch_page/fetch_listing: a POST primes a session (or runs a subject
+search when subject_name is set) and a GET with the base64 class_number_searched/term/session/inst params returns
+a class detail page. Statuses churn in the background so the monitor has real changes to detect. With
+--session-ttl, sessions expire like the real ones: a GET on an unknown or expired session gets the 200 search page.
+
+    python benchmarks/standin_server.py --port 8765 --courses 1000 --latency 0.05 --error-rate 0.01 --churn 5
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from base64 import b64decode, b64encode
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONTROLLER_PATH = "/CFGlobalSearchTool/CFSearchToolController"
+FLIPS_PATH = "/__flips"
+FIRST_CLASS_NUMBER = 10000
+
+CLASS_PAGE = """<html><head><title>Class Detail</title></head>
+<body>
+<div class="container shadowbox">
+  <p><span>{course_name} - {section} </span>- Synthetic Course {class_number}</p>
+</div>
+<table class="classDetails">
+<tr><td>Class Number</td><td>{class_number}</td></tr>
+<tr><td>Status</td><td><img src="{status_icon}.gif" title="{status}" alt="{status}"/> {status}</td></tr>
+</table>
+<table>
+<tr><th>Days And Times</th><th>Room</th><th>Instructor</th><th>Meeting Dates</th></tr>
+<tr><td data-label="Days And Times">MoWe 10:45AM - 12:00PM</td><td data-label="Room">Science Bldg C205</td>
+<td data-label="Instructor">{instructor}</td><td data-label="Meeting Dates">08/25/2025 - 12/22/2025</td></tr>
+</table>
+<b>Class Availability</b>
+<table><tr><td>Class Capacity</td><td><span>{capacity}</span></td></tr>
+<tr><td>Wait List Capacity</td><td><span>10</span></td></tr>
+<tr><td>Enrollment Total</td><td><span>{enrolled}</span></td></tr>
+<tr><td>Wait List Total</td><td><span>0</span></td></tr>
+<tr><td>Available Seats</td><td><span>{available}</span></td></tr></table>
+</body></html>"""
+
+LISTING_ROW = """<tr><td><a href="CFSearchToolController?class_number_searched={class_number_b64}">{class_number}</a></td>
+<td>{section}</td><td><img src="{status_icon}.gif" title="{status}" alt="{status}"/></td></tr>"""
+
+SEARCH_PAGE = "<html><body><form name='searchform'>Search criteria</form></body></html>"
+
+
+def course_name(class_number: int) -> str:
+    index = class_number - FIRST_CLASS_NUMBER
+    return f"SUBJ{index % 50} {100 + index % 300}"
+
+
+class CourseState:
+    def __init__(self, courses: int, churn: float, seed: int = 0) -> None:
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.capacity = 30
+        self.enrolled: dict[int, int] = {
+            FIRST_CLASS_NUMBER + i: self.random.choice((self.capacity, self.random.randint(0, self.capacity)))
+            for i in range(courses)
+        }
+        # Wall-clock time of the last Open/Closed flip per class number, served at FLIPS_PATH for the benchmark
+        self.flipped_at: dict[int, float] = {}
+        self.churn = churn
+
+    def status(self, class_number: int) -> str:
+        return "Open" if self.enrolled[class_number] < self.capacity else "Closed"
+
+    def flip_random(self) -> None:
+        with self.lock:
+            class_number = self.random.choice(list(self.enrolled))
+            self.enrolled[class_number] = self.capacity if self.status(class_number) == "Open" else self.capacity - 1
+            self.flipped_at[class_number] = time.time()
+
+    def run_churn(self) -> None:
+        while self.churn > 0:
+            time.sleep(self.random.expovariate(self.churn))
+            self.flip_random()
+
+    def render_class(self, class_number: int) -> str:
+        with self.lock:
+            enrolled = self.enrolled[class_number]
+            status = self.status(class_number)
+        return CLASS_PAGE.format(
+            course_name=course_name(class_number),
+            section="01",
+            class_number=class_number,
+            status=status,
+            status_icon=status.lower(),
+            instructor="" if class_number % 7 == 0 else "Jane Doe",
+            capacity=self.capacity,
+            enrolled=enrolled,
+            available=self.capacity - enrolled,
+        )
+
+    def render_listing(self, subject: str) -> str:
+        rows: list[str] = []
+        with self.lock:
+            for class_number in self.enrolled:
+                if course_name(class_number).split()[0] != subject:
+                    continue
+                status = self.status(class_number)
+                rows.append(LISTING_ROW.format(
+                    class_number_b64=b64encode(str(class_number).encode()).decode(),
+                    class_number=class_number,
+                    section="01-LEC Regular",
+                    status=status,
+                    status_icon=status.lower(),
+                ))
+        return "<html><body><table class='classinfo'>" + "".join(rows) + "</table></body></html>"
+
+
+def make_handler(state: CourseState, latency: float, error_rate: float, session_ttl: float = 0) -> type[BaseHTTPRequestHandler]:
+    # Session id -> time it was primed, only consulted when session_ttl is set
+    primed_at: dict[str, float] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+        def session_id(self) -> str | None:
+            morsel = SimpleCookie(self.headers.get("Cookie", "")).get("JSESSIONID")
+            return morsel.value if morsel else None
+
+        def respond(self, status: int, body: str, session_id: str | None = None) -> None:
+            payload = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=UTF-8")
+            self.send_header("Content-Length", str(len(payload)))
+            if session_id is not None:
+                self.send_header("Set-Cookie", f"JSESSIONID={session_id}; Path=/")
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def session_expired(self) -> bool:
+            if not session_ttl:
+                return False
+            started = primed_at.get(self.session_id() or "")
+            return started is None or time.time() - started > session_ttl
+
+        def simulate(self) -> bool:
+            if latency:
+                time.sleep(random.uniform(0.5*latency, 1.5*latency))
+            if random.random() < error_rate:
+                self.respond(500, "<html><body>Internal Server Error</body></html>")
+                return False
+            return True
+
+        def do_POST(self) -> None:
+            form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+            if urlparse(self.path).path != CONTROLLER_PATH:
+                self.respond(404, "Not Found")
+            elif self.simulate():
+                subject = form.get("subject_name", [""])[0]
+                if subject:
+                    self.respond(200, state.render_listing(subject))
+                    return
+                session_id = self.session_id() or f"{random.getrandbits(64):x}"
+                primed_at[session_id] = time.time()
+                self.respond(200, SEARCH_PAGE, session_id)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == FLIPS_PATH:
+                with state.lock:
+                    self.respond(200, json.dumps(state.flipped_at))
+                return
+            if url.path != CONTROLLER_PATH:
+                self.respond(404, "Not Found")
+                return
+            if not self.simulate():
+                return
+            if self.session_expired():
+                self.respond(200, SEARCH_PAGE)
+                return
+            try:
+                class_number = int(b64decode(parse_qs(url.query)["class_number_searched"][0]).decode())
+                self.respond(200, state.render_class(class_number))
+            except (KeyError, ValueError):
+                # The real site answers unknown classes with a 200 search page, not an error
+                self.respond(200, SEARCH_PAGE)
+
+    return Handler
+
+
+def serve(
+    port: int,
+    courses: int,
+    latency: float,
+    error_rate: float,
+    churn: float,
+    ready: threading.Event | None = None,
+    session_ttl: float = 0
+) -> None:
+    state = CourseState(courses, churn)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, latency, error_rate, session_ttl))
+    server.daemon_threads = True
+    threading.Thread(target=state.run_churn, daemon=True).start()
+    if ready is not None:
+        ready.set()
+    server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--courses", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--churn", type=float, default=1.0, help="status flips per second across all courses")
+    parser.add_argument("--session-ttl", type=float, default=0, help="seconds before a primed session expires, 0 to never")
+    args = parser.parse_args()
+    print(f"Serving {args.courses} courses on http://127.0.0.1:{args.port}{CONTROLLER_PATH}", file=sys.stderr)
+    serve(args.port, args.courses, args.latency, args.error_rate, args.churn, session_ttl=args.session_ttl)
+
+
+if __name__ == "__main__":
+    main()
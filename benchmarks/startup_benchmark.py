@@ -0,0 +1,136 @@
+"""Startup benchmark: import cost of the package and time-to-ready of the bot's setup_hook.
+
+Import times are measured in fresh interpreters. Time-to-ready runs setup_hook in a fresh process against fake
+guilds whose tree.sync sleeps for --sync-latency, once on an empty database (every guild synced) and once more on
+the same database (a restart, where the command tree fingerprint lets every guild be skipped). It excludes the
+gateway connection, which the bot does not control.
+
+    python benchmarks/startup_benchmark.py --guilds 50 --sync-latency 0.5 --repeat 3 --json startup.json
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR/"src"))
+
+IMPORT_TARGETS = ("cuny_search", "cuny_search.processor", "cuny_search.discord_bot")
+
+
+def time_import(module: str) -> float:
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True, cwd=ROOT_DIR/"src"
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+async def run_setup(db_path: Path, guilds: int, sync_latency: float) -> dict:
+    os.environ["METRICS_PORT"] = "0"
+    import discord
+    from icecream import ic
+    from cuny_search import discord_bot
+    from cuny_search.database import DatabaseManager
+    ic.disable()
+
+    client = discord_bot.client
+    client.database = DatabaseManager(db_path)
+    synced: list[int] = []
+
+    async def fetch_guilds():
+        for guild_id in range(1, guilds + 1):
+            yield discord.Object(id=guild_id)
+
+    async def sync(*, guild: discord.abc.Snowflake | None = None) -> list:
+        await asyncio.sleep(sync_latency)
+        synced.append(guild.id)
+        return []
+
+    client.fetch_guilds = fetch_guilds
+    client.tree.sync = sync
+
+    await client.setup_hook()
+    ready = time.perf_counter() - STARTED
+
+    await client.supervisor.stop()
+    await client.dispatcher.stop()
+    await client.sessions.close()
+    await client.leases.release()
+    await client.database.close()
+    return {"time_to_ready_seconds": round(ready, 3), "guilds_synced": len(synced)}
+
+
+def run_single_process(db_path: Path, args: argparse.Namespace) -> dict:
+    output = subprocess.run(
+        [
+            sys.executable, __file__, "--single", str(db_path),
+            "--guilds", str(args.guilds), "--sync-latency", str(args.sync_latency)
+        ],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--sync-latency", type=float, default=0.5, help="simulated seconds per tree.sync call")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    parser.add_argument("--single", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(asyncio.run(run_setup(args.single, args.guilds, args.sync_latency))))
+        return
+
+    imports = {
+        module: round(statistics.median(time_import(module) for _ in range(args.repeat)), 3)
+        for module in IMPORT_TARGETS
+    }
+    for module, seconds in imports.items():
+        print(f"import {module:<28}{seconds*1000:>8.0f} ms")
+
+    first_starts: list[dict] = []
+    restarts: list[dict] = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp)/"classes.db"
+            first_starts.append(run_single_process(db_path, args))
+            restarts.append(run_single_process(db_path, args))
+
+    results = {
+        "guilds": args.guilds,
+        "sync_latency": args.sync_latency,
+        "import_seconds": imports,
+        "first_start": {
+            "median_seconds": statistics.median(r["time_to_ready_seconds"] for r in first_starts),
+            "guilds_synced": first_starts[-1]["guilds_synced"],
+        },
+        "restart": {
+            "median_seconds": statistics.median(r["time_to_ready_seconds"] for r in restarts),
+            "guilds_synced": restarts[-1]["guilds_synced"],
+        },
+    }
+    for name in ("first_start", "restart"):
+        print(
+            f"{name.replace('_', ' '):<12} time to ready {results[name]['median_seconds']:>7.2f} s "
+            f"({results[name]['guilds_synced']}/{args.guilds} guilds synced)"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    main()
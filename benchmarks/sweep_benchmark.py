@@ -0,0 +1,236 @@
+"""End-to-end sweep benchmark: the real monitor pipeline against the stand-in server and a fake Discord client.
+
+Each course count runs in its own subprocess so peak RSS is per size. Results are printed as a table and, with
+--json, written as one JSON object per size.
+
+    python benchmarks/sweep_benchmark.py --courses 100 1000 10000 --sweeps 3 --latency 0.05 --churn 5
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR/"src"))
+sys.path.insert(0, str(ROOT_DIR/"benchmarks"))
+
+from standin_server import CONTROLLER_PATH, FIRST_CLASS_NUMBER, FLIPS_PATH, course_name, serve
+
+NOTIFIED_PATTERN = re.compile(r"-(\d+) is now")
+CHANNELS = 20
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.received: list[tuple[float, str]] = []
+
+    async def send(self, content: str) -> None:
+        self.received.append((time.time(), content))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, courses: int, latency: float, error_rate: float, churn: float, session_ttl: float) -> multiprocessing.Process:
+    process = multiprocessing.Process(
+        target=serve, args=(port, courses, latency, error_rate, churn), kwargs={"session_ttl": session_ttl}, daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Stand-in server did not start")
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(q*len(values)), len(values) - 1)], 3)
+
+
+async def populate(conn, courses: int) -> None:
+    from cuny_search.models import CourseParams
+
+    params = [CourseParams(FIRST_CLASS_NUMBER + i) for i in range(courses)]
+    await conn.executemany(
+        "INSERT INTO course_params (uid, course_base64, session, term_code, institution) VALUES (?, ?, ?, ?, ?)",
+        [(uid, *p.get_encoded_tuple()) for uid, p in enumerate(params, start=1)]
+    )
+    await conn.executemany(
+        "INSERT INTO course_details VALUES (?, ?, ?, '', '', '', '')",
+        [(uid, p.course_number, course_name(int(p.course_number))) for uid, p in enumerate(params, start=1)]
+    )
+    # Everything starts Closed, so the first sweep also exercises the notification path for open sections
+    await conn.executemany(
+        "INSERT INTO course_availabilities VALUES (?, 'Closed', 30, 10, 30, 0, 0)",
+        [(uid,) for uid in range(1, courses + 1)]
+    )
+    await conn.executemany(
+        "INSERT INTO user_interests (uid, user_id, channel_id) VALUES (?, ?, ?)",
+        [(uid, 1000 + uid % 500, 1 + uid % CHANNELS) for uid in range(1, courses + 1)]
+    )
+    await conn.commit()
+
+
+async def run_single(args: argparse.Namespace, courses: int) -> dict:
+    port = free_port()
+    server = start_server(port, courses, args.latency, args.error_rate, args.churn, args.session_ttl)
+    os.environ["GLOBAL_SEARCH_URL"] = f"http://127.0.0.1:{port}{CONTROLLER_PATH}"
+
+    from icecream import ic
+    from cuny_search import access_db as db, initialize_tables, shutdown_executor
+    from cuny_search import discord_bot
+    from cuny_search.database import DatabaseManager
+    from cuny_search.scraper import RequestGovernor
+    ic.disable()
+
+    client = discord_bot.client
+    channels: dict[int, FakeChannel] = {}
+
+    async def fetch_channel(channel_id: int) -> FakeChannel:
+        return channels.setdefault(channel_id, FakeChannel(channel_id))
+
+    client.get_channel = lambda channel_id: channels.setdefault(channel_id, FakeChannel(channel_id))
+    client.fetch_channel = fetch_channel
+    client.governor = RequestGovernor(rate=args.rate, burst=args.rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client.database = DatabaseManager(Path(tmp)/"classes.db")
+        await client.database.open()
+        async with client.database.writer() as conn:
+            await initialize_tables(conn)
+            await populate(conn, courses)
+        client.dispatcher.start()
+
+        started_at = time.time()
+        sweep_times: list[float] = []
+        for sweep in range(args.sweeps):
+            if sweep:
+                await asyncio.sleep(args.interval)
+            async with client.database.reader() as conn:
+                rows = await db.fetch_all_course_params(conn)
+            sweep_start = time.perf_counter()
+            await discord_bot.run_sweep(rows)
+            sweep_times.append(time.perf_counter() - sweep_start)
+
+        # Wait for the dispatcher to drain every alert the sweeps wrote to the outbox
+        pending = 1
+        while pending:
+            await asyncio.sleep(0.05)
+            async with client.database.reader() as conn:
+                async with conn.execute("SELECT COUNT(*) FROM notification_outbox") as cursor:
+                    pending = (await cursor.fetchone())[0]
+
+        await client.dispatcher.stop()
+        await client.sessions.close()
+        await client.database.close()
+        shutdown_executor()
+
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{FLIPS_PATH}") as response:
+        flips = {int(k): v for k, v in json.loads(response.read()).items()}
+    server.terminate()
+
+    # Detection latency: time from a flip on the server to the first notification mentioning that class after it
+    received: dict[int, list[float]] = {}
+    for channel in channels.values():
+        for received_at, content in channel.received:
+            for class_number in NOTIFIED_PATTERN.findall(content):
+                received.setdefault(int(class_number), []).append(received_at)
+
+    latencies: list[float] = []
+    for class_number, flipped_at in flips.items():
+        if flipped_at < started_at:
+            continue
+        after = [t for t in received.get(class_number, []) if t >= flipped_at]
+        if after:
+            latencies.append(min(after) - flipped_at)
+
+    total_time = sum(sweep_times)
+    return {
+        "courses": courses,
+        "sweeps": args.sweeps,
+        "sweep_seconds": [round(t, 3) for t in sweep_times],
+        "median_sweep_seconds": round(statistics.median(sweep_times), 3),
+        "courses_per_second": round(courses*args.sweeps/total_time, 1) if total_time else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss/1024, 1),
+        "notifications": sum(len(channel.received) for channel in channels.values()),
+        "flips_detected": len(latencies),
+        "flips_total": sum(1 for t in flips.values() if t >= started_at),
+        "detection_p50_seconds": percentile(latencies, 0.5),
+        "detection_p95_seconds": percentile(latencies, 0.95),
+        "fingerprint_hit_rate": round(client.fingerprints.hit_rate(), 3),
+        "session_refreshes": round(client.metrics.session_refreshes.total()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sweeps", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean stand-in response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--churn", type=float, default=5.0, help="status flips per second across all courses")
+    parser.add_argument(
+        "--interval", type=float, default=3.0,
+        help="pause between sweeps; keep it above SINGLE_FLIGHT_TTL or later sweeps only measure coalesced results"
+    )
+    parser.add_argument(
+        "--session-ttl", type=float, default=0,
+        help="stand-in session lifetime in seconds, 0 to never expire; keep it above SESSION_EXPIRY_GRACE"
+    )
+    parser.add_argument("--rate", type=float, default=1000.0, help="request governor rate limit for the run")
+    parser.add_argument("--json", type=Path, help="write one JSON object per course count to this file")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(asyncio.run(run_single(args, args.single))))
+        return
+
+    passthrough = [
+        "--sweeps", str(args.sweeps), "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+        "--churn", str(args.churn), "--interval", str(args.interval), "--rate", str(args.rate),
+        "--session-ttl", str(args.session_ttl)
+    ]
+    results: list[dict] = []
+    for courses in args.courses:
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", str(courses), *passthrough],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(
+            f"{courses:>6} courses: median sweep {result['median_sweep_seconds']:.2f}s, "
+            f"{result['courses_per_second']} courses/s, peak RSS {result['peak_rss_mb']} MB, "
+            f"detection p50/p95 {result['detection_p50_seconds']}/{result['detection_p95_seconds']}s "
+            f"({result['flips_detected']}/{result['flips_total']} flips), {result['session_refreshes']} session refreshes"
+        )
+
+    if args.json:
+        args.json.write_text("".join(json.dumps(result) + "\n" for result in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
+from importlib import import_module
 from pathlib import Path
+from typing import Any
 
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 DATA_DIR = ROOT_DIR / "data"
 
-from . import access_db, constants, models, utils
-from .create_db import initialize_tables
-from .processor import process
-from .scraper import refresh_client, scrape
+# Submodules pull in discord, bs4, lxml, httpx and aiosqlite, so nothing is imported until it is first used.
+# Parser pool workers and the benchmarks then only pay for what they touch.
+_LAZY_ATTRS: dict[str, tuple[str, str | None]] = {
+    "access_db": ("cuny_search.access_db", None),
+    "constants": ("cuny_search.constants", None),
+    "models": ("cuny_search.models", None),
+    "utils": ("cuny_search.utils", None),
+    "initialize_tables": ("cuny_search.create_db", "initialize_tables"),
+    "process": ("cuny_search.processor", "process"),
+    "process_fast": ("cuny_search.processor", "process_fast"),
+    "process_page": ("cuny_search.processor", "process_page"),
+    "process_page_async": ("cuny_search.processor", "process_page_async"),
+    "shutdown_executor": ("cuny_search.processor", "shutdown_executor"),
+    "fetch_page": ("cuny_search.scraper", "fetch_page"),
+    "refresh_client": ("cuny_search.scraper", "refresh_client"),
+    "scrape": ("cuny_search.scraper", "scrape"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_ATTRS[name]
+    value = import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "DATA_DIR",
@@ -17,5 +44,10 @@ __all__ = [
     "initialize_tables",
     "refresh_client",
     "process",
+    "process_fast",
+    "process_page",
+    "process_page_async",
+    "shutdown_executor",
+    "fetch_page",
     "scrape"
-]
\ No newline at end of file
+]
@@ -1,9 +1,12 @@
 from collections.abc import Iterable
 from dataclasses import astuple
-from aiosqlite import Connection, Row
+from time import time
+from typing import Optional
+from aiosqlite import Connection, Cursor, Row
 from icecream import ic
-from cuny_search.constants import AMBIGUOUS, NOT_FOUND
+from cuny_search.constants import AMBIGUOUS, HISTORY_BUCKET, HISTORY_RAW_RETENTION, HISTORY_RETENTION, NOT_FOUND
 from cuny_search.models import CourseParams, CourseAvailabilities, CourseDetails, UserInterests
+from cuny_search.utils import get_status_code, status_changed
 
 
 async def is_database_empty(conn: Connection) -> bool:
@@ -98,9 +101,44 @@ async def add_course_details(conn: Connection, uid: int, course_details: CourseD
         ic(f"DB error occurred while inserting/updating course details {course_details}: {e}")
 
 
+def get_history_row(uid: int, ts: int, prev: Optional[Row], course_availabilities: CourseAvailabilities) -> tuple | None:
+    # prev is (status, currently_enrolled, currently_waitlisted, available_seats), or None for a course's first row
+    counts = (
+        course_availabilities.currently_enrolled or 0,
+        course_availabilities.currently_waitlisted or 0,
+        course_availabilities.available_seats or 0
+    )
+    prev_status, *prev_counts = prev if prev is not None else (None, 0, 0, 0)
+    prev_counts = tuple(count or 0 for count in prev_counts)
+    if prev is not None and prev_status == course_availabilities.status and prev_counts == counts:
+        return None
+    return (ts, get_status_code(course_availabilities.status), *(new - old for new, old in zip(counts, prev_counts)), uid)
+
+
+async def add_history_rows(cursor: Cursor, rows: list[tuple]) -> None:
+    # Two changes to one course within the same second fold into one row; courses removed mid-sweep are skipped
+    await cursor.executemany("""
+        INSERT INTO availability_history (uid, ts, status, enrolled_delta, waitlisted_delta, available_delta)
+        SELECT uid, ?, ?, ?, ?, ? FROM course_params WHERE uid = ?
+        ON CONFLICT(uid, ts) DO UPDATE SET
+            status = excluded.status,
+            enrolled_delta = enrolled_delta + excluded.enrolled_delta,
+            waitlisted_delta = waitlisted_delta + excluded.waitlisted_delta,
+            available_delta = available_delta + excluded.available_delta,
+            changes = changes + 1
+    """, rows)
+
+
 async def add_course_availability(conn: Connection, uid: int, course_availabilities: CourseAvailabilities) -> None:
     try:
         async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT status, currently_enrolled, currently_waitlisted, available_seats
+                FROM course_availabilities
+                WHERE uid = ?
+            """, (uid,))
+            prev = await cursor.fetchone()
+
             await cursor.execute("""
                 INSERT INTO course_availabilities (
                     uid,
@@ -119,6 +157,10 @@ async def add_course_availability(conn: Connection, uid: int, course_availabilit
                     currently_waitlisted = excluded.currently_waitlisted,
                     available_seats = excluded.available_seats
             """, (uid, *astuple(course_availabilities)))
+
+            history_row = get_history_row(uid, int(time()), prev, course_availabilities)
+            if history_row:
+                await add_history_rows(cursor, [history_row])
             await conn.commit()
     except Exception as e:
         ic(f"DB error occurred while attempting to insert/update course availability {course_availabilities}: {e}")
@@ -160,15 +202,27 @@ async def get_course_availability(conn: Connection, course_params: CourseParams)
         return None
 
 
-async def update_course_availability(conn: Connection, uid: int, course_availabilities: CourseAvailabilities) -> str | None:
+async def update_course_availabilities(
+    conn: Connection,
+    availabilities: dict[int, CourseAvailabilities],
+    fingerprints: Optional[dict[int, str]] = None
+) -> list[tuple[int, str, str, bool]] | None:
     try:
-        async with conn.cursor() as cursor:
-            await cursor.execute("""
-                SELECT status FROM course_availabilities WHERE uid = ?
-            """, (uid,))
-            prev_status = await cursor.fetchone()
+        uids = list(availabilities)
+        prev_rows: dict[int, Row] = {}
 
-            await cursor.execute("""
+        async with conn.cursor() as cursor:
+            # Stay well under SQLite's bound parameter limit
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i+500]
+                await cursor.execute(f"""
+                    SELECT uid, status, currently_enrolled, currently_waitlisted, available_seats
+                    FROM course_availabilities
+                    WHERE uid IN ({", ".join("?" * len(chunk))})
+                """, chunk)
+                prev_rows.update((row[0], row[1:]) for row in await cursor.fetchall())
+
+            await cursor.executemany("""
                 UPDATE course_availabilities
                 SET
                     status = ?,
@@ -178,11 +232,44 @@ async def update_course_availability(conn: Connection, uid: int, course_availabi
                     currently_waitlisted = ?,
                     available_seats = ?
                 WHERE uid = ?
-            """, (*astuple(course_availabilities), uid))
+            """, [(*astuple(course_availabilities), uid) for uid, course_availabilities in availabilities.items()])
+
+            if fingerprints:
+                # Courses removed mid-sweep are skipped instead of failing the foreign key
+                await cursor.executemany("""
+                    INSERT INTO page_fingerprints (uid, fingerprint)
+                    SELECT uid, ? FROM course_params WHERE uid = ?
+                    ON CONFLICT(uid) DO UPDATE SET fingerprint = excluded.fingerprint
+                """, [(fingerprint, uid) for uid, fingerprint in fingerprints.items()])
+
+            # Only courses whose status or seat counts moved get a history row
+            ts = int(time())
+            history_rows = [
+                row for uid, course_availabilities in availabilities.items()
+                if uid in prev_rows and (row := get_history_row(uid, ts, prev_rows[uid], course_availabilities))
+            ]
+            if history_rows:
+                await add_history_rows(cursor, history_rows)
+
+            # Alerts commit with the change itself, so a crash or a failed send can never lose one
+            await cursor.executemany("""
+                INSERT INTO notification_outbox (uid, channel_id, status, created_at)
+                SELECT DISTINCT uid, channel_id, ?, ? FROM user_interests WHERE uid = ? AND dead_since IS NULL
+            """, [
+                (course_availabilities.status, ts, uid) for uid, course_availabilities in availabilities.items()
+                if uid in prev_rows and status_changed(prev_rows[uid][0], course_availabilities.status)
+            ])
             await conn.commit()
-            return prev_status[0] if prev_status else None
+
+        # (uid, previous status, new status, whether status or seat counts moved) for every course still tracked
+        moved = {row[-1] for row in history_rows}
+        return [
+            (uid, prev_rows[uid][0], course_availabilities.status, uid in moved)
+            for uid, course_availabilities in availabilities.items() if uid in prev_rows
+        ]
     except Exception as e:
-        ic(f"Error occurred while trying to update {course_availabilities}: {e}")
+        ic(f"Error occurred while trying to update availabilities for {list(availabilities)}: {e}")
+        await conn.rollback()
         return None
 
 
@@ -196,6 +283,36 @@ async def fetch_all_course_params(conn: Connection) -> Iterable[Row]:
         return []
 
 
+async def fetch_polling_stats(conn: Connection) -> Iterable[Row]:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT course_params.uid, COUNT(user_interests.user_id), course_availabilities.available_seats
+                FROM course_params
+                LEFT JOIN user_interests ON user_interests.uid = course_params.uid AND user_interests.dead_since IS NULL
+                LEFT JOIN course_availabilities ON course_availabilities.uid = course_params.uid
+                GROUP BY course_params.uid
+            """)
+            return await cursor.fetchall()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to fetch polling stats: {e}")
+        return []
+
+
+async def fetch_listing_info(conn: Connection) -> Iterable[Row]:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT course_details.uid, course_details.course_number, course_details.course_name, course_availabilities.status
+                FROM course_details
+                JOIN course_availabilities ON course_availabilities.uid = course_details.uid
+            """)
+            return await cursor.fetchall()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to fetch listing info: {e}")
+        return []
+
+
 async def fetch_all_course_numbers_and_names(conn: Connection) -> Iterable[Row]:
     try:
         async with conn.cursor() as cursor:
@@ -209,7 +326,10 @@ async def fetch_all_course_numbers_and_names(conn: Connection) -> Iterable[Row]:
 async def add_user_interest(conn: Connection, user_interests: UserInterests) -> None:
     try:
         async with conn.cursor() as cursor:
-            await cursor.execute("INSERT INTO user_interests VALUES (?, ?, ?)", astuple(user_interests))
+            await cursor.execute("""
+                INSERT INTO user_interests (uid, user_id, channel_id) VALUES (?, ?, ?)
+                ON CONFLICT(uid, user_id) DO UPDATE SET channel_id = excluded.channel_id, dead_since = NULL
+            """, astuple(user_interests))
             await conn.commit()
     except Exception as e:
         ic(f"DB error occurred while attempting to add user interest {user_interests}: {e}")
@@ -224,11 +344,13 @@ async def remove_user_interest(conn: Connection, course_params: CourseParams, us
 
             await cursor.execute("DELETE FROM user_interests WHERE uid = ? AND user_id = ?", (uid, user_id))
             if cursor.rowcount == 0:
+                await conn.rollback()
                 return NOT_FOUND
 
             await cursor.execute("SELECT COUNT(*) FROM user_interests WHERE uid = ?", (uid,))
             remaining_users_interested = await cursor.fetchone()
             if not remaining_users_interested:
+                await conn.rollback()
                 return NOT_FOUND
 
             if remaining_users_interested[0] == 0:
@@ -237,6 +359,7 @@ async def remove_user_interest(conn: Connection, course_params: CourseParams, us
             return remaining_users_interested[0]
     except Exception as e:
         ic(f"Error while removing interest for {course_params}, user_id={user_id}: {e}")
+        await conn.rollback()
         return NOT_FOUND
 
 
@@ -244,7 +367,7 @@ async def is_course_in_user_interests(conn: Connection, uid: int, user_id: int)
     try:
         async with conn.cursor() as cursor:
             await cursor.execute(
-                "SELECT 1 FROM user_interests WHERE uid = ? AND user_id = ? LIMIT 1",
+                "SELECT 1 FROM user_interests WHERE uid = ? AND user_id = ? AND dead_since IS NULL LIMIT 1",
                 (uid, user_id)
             )
             result = await cursor.fetchone()
@@ -258,7 +381,7 @@ async def fetch_user_interests(conn: Connection, user_id: int) -> Iterable[Row]:
     try:
         async with conn.cursor() as cursor:
             await cursor.execute("""
-                SELECT *
+                SELECT user_interests.uid, user_interests.user_id, user_interests.channel_id, course_details.*
                 FROM user_interests
                 JOIN course_details ON user_interests.uid = course_details.uid
                 WHERE user_interests.user_id = ?
@@ -272,12 +395,324 @@ async def fetch_user_interests(conn: Connection, user_id: int) -> Iterable[Row]:
 async def fetch_all_users_and_channels_for_course(conn: Connection, uid: int) -> Iterable[Row]:
     try:
         async with conn.cursor() as cursor:
-            await cursor.execute("SELECT user_id, channel_id FROM user_interests WHERE uid = ?", (uid,))
+            await cursor.execute("SELECT user_id, channel_id FROM user_interests WHERE uid = ? AND dead_since IS NULL", (uid,))
             return await cursor.fetchall()
     except Exception as e:
         ic(f"DB error occurred while attempting to fetch all users interested in {uid}: {e}")
         return []
 
 
+async def fetch_page_fingerprints(conn: Connection, shard_count: int, shards: Iterable[int]) -> Iterable[Row]:
+    shards = list(shards)
+    placeholders = ", ".join("?" for _ in shards)
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                f"SELECT uid, fingerprint FROM page_fingerprints WHERE uid % ? IN ({placeholders})",
+                (shard_count, *shards)
+            )
+            return await cursor.fetchall()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to fetch page fingerprints for shards {shards}: {e}")
+        return []
+
+
+async def set_channels_dead(conn: Connection, channel_ids: Iterable[int], dead_since: Optional[int]) -> None:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.executemany(
+                "UPDATE user_interests SET dead_since = ? WHERE channel_id = ?",
+                [(dead_since, str(channel_id)) for channel_id in channel_ids]
+            )
+            await conn.commit()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to mark channels {channel_ids} as dead={dead_since}: {e}")
+
+
+async def prune_dead_user_interests(conn: Connection, dead_before: int) -> int:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("DELETE FROM user_interests WHERE dead_since < ?", (dead_before,))
+            pruned = cursor.rowcount
+
+            # Same rule as remove_user_interest: a course nobody tracks anymore is dropped
+            await cursor.execute("""
+                DELETE FROM course_params
+                WHERE NOT EXISTS (SELECT 1 FROM user_interests WHERE user_interests.uid = course_params.uid)
+            """)
+            await conn.commit()
+            return pruned
+    except Exception as e:
+        ic(f"DB error occurred while attempting to prune dead user interests: {e}")
+        return 0
+
+
+async def fetch_availability_history(conn: Connection, course_params: CourseParams, since: int) -> Iterable[Row] | None:
+    # Rows are (ts, status, changes, enrolled, waitlisted, available, prev_status) with absolute seat counts
+    try:
+        uid = await get_unique_uid(conn, course_params)
+        if uid < 0:
+            return None
+
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT ts, status, changes, enrolled, waitlisted, available, prev_status
+                FROM (
+                    SELECT
+                        ts,
+                        status,
+                        changes,
+                        SUM(enrolled_delta) OVER running AS enrolled,
+                        SUM(waitlisted_delta) OVER running AS waitlisted,
+                        SUM(available_delta) OVER running AS available,
+                        LAG(status) OVER running AS prev_status
+                    FROM availability_history
+                    WHERE uid = ?
+                    WINDOW running AS (ORDER BY ts)
+                )
+                WHERE ts >= ?
+                ORDER BY ts
+            """, (uid, since))
+            return await cursor.fetchall()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to fetch availability history for {course_params}: {e}")
+        return None
+
+
+async def merge_history(cursor: Cursor, before: int, bucket: Optional[int]) -> int:
+    # Collapses every group of rows older than `before` into its last row. Deltas are summed, so running sums
+    # over the remaining rows still give the same absolute counts. Groups are per bucket, or per uid when bucket is None.
+    bucket_expr = "ts / ?" if bucket else "0"
+    bucket_params = (bucket,) if bucket else ()
+    await cursor.execute(f"""
+        CREATE TEMP TABLE history_merge AS
+        WITH groups AS (
+            SELECT
+                uid,
+                {bucket_expr} AS bucket,
+                MAX(ts) AS last_ts,
+                SUM(enrolled_delta) AS enrolled_delta,
+                SUM(waitlisted_delta) AS waitlisted_delta,
+                SUM(available_delta) AS available_delta,
+                SUM(changes) AS changes,
+                COUNT(*) AS merged
+            FROM availability_history
+            WHERE ts < ?
+            GROUP BY uid, bucket
+            HAVING COUNT(*) > 1
+        )
+        SELECT groups.*, availability_history.status
+        FROM groups
+        JOIN availability_history ON availability_history.uid = groups.uid AND availability_history.ts = groups.last_ts
+    """, (*bucket_params, before))
+    try:
+        await cursor.execute("SELECT COALESCE(SUM(merged - 1), 0) FROM history_merge")
+        removed = (await cursor.fetchone())[0]
+        if removed:
+            await cursor.execute(f"""
+                DELETE FROM availability_history
+                WHERE ts < ? AND (uid, {bucket_expr}) IN (SELECT uid, bucket FROM history_merge)
+            """, (before, *bucket_params))
+            await cursor.execute("""
+                INSERT INTO availability_history
+                    (uid, ts, status, enrolled_delta, waitlisted_delta, available_delta, changes)
+                SELECT uid, last_ts, status, enrolled_delta, waitlisted_delta, available_delta, changes
+                FROM history_merge
+            """)
+        return removed
+    finally:
+        await cursor.execute("DROP TABLE history_merge")
+
+
+async def compact_availability_history(conn: Connection, now: Optional[int] = None) -> int:
+    now = int(now if now is not None else time())
+    # Aligned to a bucket boundary so no bucket is split between raw and merged rows
+    raw_before = int(now - HISTORY_RAW_RETENTION) // HISTORY_BUCKET * HISTORY_BUCKET
+    try:
+        async with conn.cursor() as cursor:
+            # Past retention every course keeps a single row carrying the sum of its old deltas
+            removed = await merge_history(cursor, int(now - HISTORY_RETENTION), None)
+            removed += await merge_history(cursor, raw_before, HISTORY_BUCKET)
+            await conn.commit()
+            return removed
+    except Exception as e:
+        ic(f"DB error occurred while attempting to compact availability history: {e}")
+        await conn.rollback()
+        return 0
+
+
+async def claim_outbox(conn: Connection, owner: str, now: float, limit: int, claim_ttl: float) -> list[Row] | None:
+    # Rows are (id, channel_id, status, attempts, course_name, course_number, user_ids) with user_ids comma separated.
+    # Claims keep concurrent consumers in other processes from sending the same row twice.
+    try:
+        await conn.execute("BEGIN IMMEDIATE")
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT id FROM notification_outbox
+                WHERE next_attempt_at <= ? AND claimed_until <= ?
+                ORDER BY id
+                LIMIT ?
+            """, (now, now, limit))
+            ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                await conn.commit()
+                return []
+
+            placeholders = ", ".join("?" * len(ids))
+            await cursor.execute(
+                f"UPDATE notification_outbox SET claimed_by = ?, claimed_until = ? WHERE id IN ({placeholders})",
+                (owner, now + claim_ttl, *ids)
+            )
+            # Mentions are resolved now, so anyone who stopped tracking the course since the change is left out
+            await cursor.execute(f"""
+                SELECT
+                    notification_outbox.id,
+                    notification_outbox.channel_id,
+                    notification_outbox.status,
+                    notification_outbox.attempts,
+                    course_details.course_name,
+                    course_details.course_number,
+                    (
+                        SELECT GROUP_CONCAT(user_id) FROM user_interests
+                        WHERE user_interests.uid = notification_outbox.uid
+                        AND user_interests.channel_id = notification_outbox.channel_id
+                        AND user_interests.dead_since IS NULL
+                    )
+                FROM notification_outbox
+                LEFT JOIN course_details ON course_details.uid = notification_outbox.uid
+                WHERE notification_outbox.id IN ({placeholders})
+                ORDER BY notification_outbox.id
+            """, ids)
+            rows = await cursor.fetchall()
+            await conn.commit()
+            return rows
+    except Exception as e:
+        ic(f"DB error occurred while attempting to claim notifications: {e}")
+        await conn.rollback()
+        return None
+
+
+async def delete_outbox_rows(conn: Connection, ids: Iterable[int]) -> None:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.executemany("DELETE FROM notification_outbox WHERE id = ?", [(outbox_id,) for outbox_id in ids])
+            await conn.commit()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to delete sent notifications: {e}")
+
+
+async def expire_outbox_rows(conn: Connection, created_before: float, now: float) -> int:
+    # Rows another consumer has claimed are left for it to finish or let lapse
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "DELETE FROM notification_outbox WHERE created_at < ? AND claimed_until <= ?", (created_before, now)
+            )
+            await conn.commit()
+            return cursor.rowcount
+    except Exception as e:
+        ic(f"DB error occurred while attempting to expire old notifications: {e}")
+        return 0
+
+
+async def retry_outbox_rows(conn: Connection, retries: Iterable[tuple[int, float]]) -> None:
+    # retries are (id, next_attempt_at); the claim is dropped so any consumer can pick the row up again
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.executemany("""
+                UPDATE notification_outbox
+                SET attempts = attempts + 1, next_attempt_at = ?, claimed_by = NULL, claimed_until = 0
+                WHERE id = ?
+            """, [(next_attempt_at, outbox_id) for outbox_id, next_attempt_at in retries])
+            await conn.commit()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to reschedule notifications: {e}")
+
+
+async def fetch_command_fingerprints(conn: Connection) -> dict[int, str]:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT guild_id, fingerprint FROM command_syncs")
+            return {int(guild_id): fingerprint for guild_id, fingerprint in await cursor.fetchall()}
+    except Exception as e:
+        ic(f"DB error occurred while attempting to fetch command fingerprints: {e}")
+        return {}
+
+
+async def set_command_fingerprint(conn: Connection, guild_id: int, fingerprint: str) -> None:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                INSERT INTO command_syncs (guild_id, fingerprint) VALUES (?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET fingerprint = excluded.fingerprint
+            """, (str(guild_id), fingerprint))
+            await conn.commit()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to record the command fingerprint for guild {guild_id}: {e}")
+
+
+async def renew_leases(conn: Connection, owner: str, shards: int, ttl: float, now: float) -> set[int] | None:
+    # Extends this owner's live leases, then gives back or claims shards to hold a fair share of the live owners.
+    # BEGIN IMMEDIATE takes the write lock up front so two processes never claim the same shard.
+    try:
+        await conn.execute("BEGIN IMMEDIATE")
+        async with conn.cursor() as cursor:
+            await cursor.execute("DELETE FROM monitor_leases WHERE shard >= ?", (shards,))
+            await cursor.executemany(
+                "INSERT OR IGNORE INTO monitor_leases (shard) VALUES (?)", [(shard,) for shard in range(shards)]
+            )
+            await cursor.execute(
+                "UPDATE monitor_leases SET expires_at = ? WHERE owner = ? AND expires_at > ?", (now + ttl, owner, now)
+            )
+            await cursor.execute("SELECT shard FROM monitor_leases WHERE owner = ? AND expires_at > ?", (owner, now))
+            owned = {row[0] for row in await cursor.fetchall()}
+
+            await cursor.execute("""
+                INSERT INTO monitor_workers (owner, expires_at) VALUES (?, ?)
+                ON CONFLICT(owner) DO UPDATE SET expires_at = excluded.expires_at
+            """, (owner, now + ttl))
+            await cursor.execute("DELETE FROM monitor_workers WHERE expires_at <= ?", (now,))
+            await cursor.execute("SELECT COUNT(*) FROM monitor_workers")
+            workers = (await cursor.fetchone())[0]
+            fair_share = -(-shards // workers)
+
+            if len(owned) > fair_share:
+                released = sorted(owned)[fair_share:]
+                await cursor.executemany(
+                    "UPDATE monitor_leases SET owner = NULL, expires_at = 0 WHERE shard = ? AND owner = ?",
+                    [(shard, owner) for shard in released]
+                )
+                owned.difference_update(released)
+            elif len(owned) < fair_share:
+                await cursor.execute("""
+                    SELECT shard FROM monitor_leases
+                    WHERE owner IS NULL OR expires_at <= ?
+                    ORDER BY shard
+                    LIMIT ?
+                """, (now, fair_share - len(owned)))
+                claimed = [row[0] for row in await cursor.fetchall()]
+                await cursor.executemany(
+                    "UPDATE monitor_leases SET owner = ?, expires_at = ? WHERE shard = ?",
+                    [(owner, now + ttl, shard) for shard in claimed]
+                )
+                owned.update(claimed)
+            await conn.commit()
+            return owned
+    except Exception as e:
+        ic(f"DB error occurred while attempting to renew monitor leases for {owner}: {e}")
+        await conn.rollback()
+        return None
+
+
+async def release_leases(conn: Connection, owner: str) -> None:
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("UPDATE monitor_leases SET owner = NULL, expires_at = 0 WHERE owner = ?", (owner,))
+            await cursor.execute("DELETE FROM monitor_workers WHERE owner = ?", (owner,))
+            await conn.commit()
+    except Exception as e:
+        ic(f"DB error occurred while attempting to release monitor leases for {owner}: {e}")
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import astuple
+from typing import Any
+from cuny_search.constants import COURSE_CACHE_SIZE
+from cuny_search.metrics import Metrics
+from cuny_search.models import CourseAvailabilities
+
+
+class LRUCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def replace(self, key: Hashable, value: Any) -> bool:
+        # Refreshes an entry in place without counting as a use
+        if key not in self.entries:
+            return False
+        self.entries[key] = value
+        return True
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class CourseCache:
+    def __init__(self, metrics: Metrics, maxsize: int = COURSE_CACHE_SIZE) -> None:
+        self.metrics = metrics
+        self.availabilities = LRUCache(maxsize)
+        self.details = LRUCache(maxsize)
+        # Several param tuples can resolve to the same uid (e.g. when only the course number is given)
+        self.keys_by_uid: dict[int, set[Hashable]] = {}
+
+    def _track(self, key: Hashable, uid: int) -> None:
+        self.keys_by_uid.setdefault(uid, set()).add(key)
+
+    def _lookup(self, cache: LRUCache, name: str, key: Hashable) -> tuple | None:
+        row = cache.get(key)
+        self.metrics.cache_lookups.inc(cache=name, result="miss" if row is None else "hit")
+        return row
+
+    def _store(self, cache: LRUCache, key: Hashable, row: tuple) -> None:
+        cache.set(key, tuple(row))
+        self._track(key, row[0])
+        self.metrics.cache_entries.set(len(self.availabilities) + len(self.details))
+
+    def get_availability(self, key: Hashable) -> tuple | None:
+        return self._lookup(self.availabilities, "availability", key)
+
+    def set_availability(self, key: Hashable, row: tuple) -> None:
+        self._store(self.availabilities, key, row)
+
+    def get_details(self, key: Hashable) -> tuple | None:
+        return self._lookup(self.details, "details", key)
+
+    def set_details(self, key: Hashable, row: tuple) -> None:
+        self._store(self.details, key, row)
+
+    def update_availability(self, uid: int, course_availabilities: CourseAvailabilities) -> None:
+        keys = self.keys_by_uid.get(uid)
+        if not keys:
+            return
+
+        row = (uid, *astuple(course_availabilities))
+        live_keys = {key for key in keys if self.availabilities.replace(key, row) or key in self.details}
+        if live_keys:
+            self.keys_by_uid[uid] = live_keys
+        else:
+            del self.keys_by_uid[uid]
+
+    def clear(self) -> None:
+        self.availabilities.clear()
+        self.details.clear()
+        self.keys_by_uid.clear()
+        self.metrics.cache_entries.set(0)
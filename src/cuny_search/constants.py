@@ -1,13 +1,73 @@
-from typing import Literal, Optional
-from discord import app_commands
+import os
+from typing import Any, Literal, Optional
 
 # Course Removal Constants
 NOT_FOUND: int = -1
 AMBIGUOUS: int = -2
 
+# Monitoring Constants
+SCRAPE_WORKERS: int = 20
+PARSE_WORKERS: int = 2
+PIPELINE_QUEUE_SIZE: int = 10
+WRITE_BATCH_SIZE: int = 100
+# Bounds in seconds for how often a single course is polled
+POLL_MIN_INTERVAL: float = 5
+POLL_MAX_INTERVAL: float = 120
+# Courses are split into shards by uid; every monitor process, the bot included, leases a share of them in the DB
+MONITOR_SHARDS: int = 16
+# Seconds a shard lease lasts without renewal, after which another worker takes the shard over
+LEASE_TTL: float = 30
+# Set MONITOR_IN_BOT=0 to leave all monitoring to headless workers started with worker.py
+MONITOR_IN_BOT: bool = os.getenv("MONITOR_IN_BOT", "1") != "0"
+# Seconds between monitor restarts after a crash, doubling up to the max; a run this long resets the backoff
+MONITOR_RESTART_BASE: float = 1
+MONITOR_RESTART_MAX: float = 60
+MONITOR_HEALTHY_AFTER: float = 5 * 60
+
+# Where pages are parsed: "process" or "thread" pool, or "inline" on the event loop
+PARSE_EXECUTOR: Literal["process", "thread", "inline"] = "process"
+PARSE_EXECUTOR_WORKERS: int = 2
+# "fast" reads the handful of needed fields with lxml XPath, "soup" builds the full BeautifulSoup DOM
+PAGE_PARSER: Literal["fast", "soup"] = "fast"
+
+# Prometheus endpoint, local only by default; a port of 0 turns it off
+METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9108"))
+# Recent observations kept per histogram for the percentiles in the admin summary
+METRICS_SAMPLE_SIZE: int = 1024
+
+# Database Constants
+DB_READERS: int = 3
+# Entries per table in the in-memory cache behind the availability and details commands
+COURSE_CACHE_SIZE: int = 1024
+# Availability history: statuses are stored as small integer codes, anything unrecognized as -1
+HISTORY_STATUS_CODES: dict[str, int] = {"Closed": 0, "Open": 1, "Wait List": 2}
+# Seconds every change is kept individually, the bucket older changes are merged into, and how long buckets are kept
+HISTORY_RAW_RETENTION: float = 14 * 24 * 60 * 60
+HISTORY_BUCKET: int = 60 * 60
+HISTORY_RETENTION: float = 365 * 24 * 60 * 60
+HISTORY_COMPACT_INTERVAL: float = 24 * 60 * 60
+
 # Discord Constants
-COURSE_NUMBERS = app_commands.Range[int, 1000, 99999]
-YEARS = Optional[app_commands.Range[int, 2025, 2125]]
+MESSAGE_CHAR_LIMIT: int = 2000
+# Set FORCE_COMMAND_SYNC=1 to sync slash commands to every guild even if their fingerprint matches
+FORCE_COMMAND_SYNC: bool = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+NOTIFY_CONCURRENCY: int = 5
+# Seconds before a channel that failed to resolve is tried again
+CHANNEL_FAILURE_TTL: float = 15 * 60
+# Seconds a watcher in a dead channel is kept before being pruned, and how often pruning runs
+DEAD_INTEREST_RETENTION: float = 7 * 24 * 60 * 60
+PRUNE_INTERVAL: float = 60 * 60
+# Notification outbox: rows claimed per pass, seconds between passes when idle, seconds a claim blocks other
+# consumers, and the retry backoff bounds in seconds
+OUTBOX_BATCH_SIZE: int = 200
+OUTBOX_POLL_INTERVAL: float = 2
+OUTBOX_CLAIM_TTL: float = 60
+OUTBOX_RETRY_BASE: float = 5
+OUTBOX_RETRY_MAX: float = 10 * 60
+# Seconds after which an undelivered alert is dropped, since the status it reports has likely moved on
+OUTBOX_MAX_AGE: float = 30 * 60
+# COURSE_NUMBERS, YEARS and HISTORY_DAYS are built by __getattr__ below on first use
 TERMS = Optional[Literal["Spring Term", "Summer Term", "Fall Term"]]
 
 SESSIONS = Optional[
@@ -70,9 +130,87 @@ INSTITUTIONS = Optional[
 ]
 
 
+SLASH_COMMAND_RANGES: tuple[str, ...] = ("COURSE_NUMBERS", "YEARS", "HISTORY_DAYS")
+
+
+def __getattr__(name: str) -> Any:
+    # The range option types need discord, which parser pool workers and scripts importing constants never use
+    if name not in SLASH_COMMAND_RANGES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from discord import app_commands
+    globals().update(
+        COURSE_NUMBERS=app_commands.Range[int, 1000, 99999],
+        YEARS=Optional[app_commands.Range[int, 2025, 2125]],
+        HISTORY_DAYS=Optional[app_commands.Range[int, 1, 365]]
+    )
+    return globals()[name]
+
+
 # Constants for scraping
+# Overridable so the monitor can be pointed at a local stand-in server
+GLOBAL_SEARCH_URL: str = os.getenv("GLOBAL_SEARCH_URL", "https://globalsearch.cuny.edu/CFGlobalSearchTool/CFSearchToolController")
 HEADERS: dict[str, str] = { "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36" }
 DEFAULT_INSTITUTION: str = "Queens College"
+# Seconds before a pooled Global Search session is primed again
+SESSION_MAX_AGE: float = 30 * 60
+# Sessions are renewed in the background this many seconds before SESSION_MAX_AGE, checked every SESSION_RENEW_INTERVAL
+SESSION_RENEW_MARGIN: float = 5 * 60
+SESSION_RENEW_INTERVAL: float = 60
+# Seconds a replaced session stays open for requests still in flight on it
+SESSION_CLOSE_GRACE: float = 30
+# Every class detail page has this header. A page without it from a session older than SESSION_EXPIRY_GRACE seconds
+# is taken as an expired session once; if the class still has no page on a fresh session, it does not exist.
+CLASS_PAGE_MARKER: str = "Class Availability"
+SESSION_EXPIRY_GRACE: float = 60
+# Consecutive failed requests before Global Search is left alone for BREAKER_COOLDOWN seconds,
+# doubling up to BREAKER_MAX_COOLDOWN each time the probe request after a cooldown fails too
+BREAKER_FAILURE_THRESHOLD: int = 10
+BREAKER_COOLDOWN: float = 30
+BREAKER_MAX_COOLDOWN: float = 10 * 60
+# Check due courses against subject result listings first and only fetch detail pages for sections whose status moved.
+# Listings only show status, so seat counts of unchanged sections are refreshed less often while this is on.
+BULK_FETCH: bool = False
+# Smallest group of due sections in one subject worth a listing request
+BULK_MIN_SECTIONS: int = 3
+LISTING_SEARCH_FORM: dict[str, str] = {
+    "selectedSubjectName": "",
+    "subject_name": "",
+    "selectedCCareerName": "",
+    "courseCareer": "",
+    "selectedCAttrName": "",
+    "courseAttr": "",
+    "selectedCAttrVName": "",
+    "courseAttValue": "",
+    "selectedReqDesName": "",
+    "reqDesignation": "",
+    "selectedSessionName": "",
+    "class_session": "",
+    "selectedModeInsName": "",
+    "meetingStart": "LT",
+    "selectedMeetingStartName": "less than",
+    "meetingStartText": "",
+    "AndMeetingStartText": "",
+    "meetingEnd": "LE",
+    "selectedMeetingEndName": "less than or equal to",
+    "meetingEndText": "",
+    "AndMeetingEndText": "",
+    "daysOfWeek": "I",
+    "selectedDaysOfWeekName": "include only these days",
+    "instructor": "B",
+    "selectedInstructorName": "begins with",
+    "instructorName": "",
+    "search_btn_search": "Search",
+}
+# Seconds a coalesced course fetch result is reused by later callers
+SINGLE_FLIGHT_TTL: float = 2
+# Outbound request governor: token bucket ceiling plus AIMD concurrency between 1 and the max
+GOVERNOR_RATE: float = 10
+GOVERNOR_BURST: float = 10
+GOVERNOR_INITIAL_CONCURRENCY: float = 5
+GOVERNOR_MAX_CONCURRENCY: float = SCRAPE_WORKERS
+# Seconds; slower responses count as a sign the site is struggling
+GOVERNOR_LATENCY_TARGET: float = 2
 
 COLLEGE_CODES: dict[str, str] = {
     "Baruch College": "BAR01",
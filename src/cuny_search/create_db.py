@@ -1,60 +1,191 @@
-import aiosqlite
+from aiosqlite import Connection
 from icecream import ic
-from cuny_search import DATA_DIR
 
+# Each entry upgrades the schema by one PRAGMA user_version. Never edit an entry once shipped, append a new one.
+MIGRATIONS: list[list[str]] = [
+    # 1: original tables, a no-op on databases created before versioning
+    [
+        """
+            CREATE TABLE IF NOT EXISTS course_params (
+                uid INTEGER PRIMARY KEY,
+                course_base64 TEXT NOT NULL,
+                session TEXT NOT NULL,
+                term_code TEXT NOT NULL,
+                institution TEXT NOT NULL,
+                UNIQUE (course_base64, session, term_code, institution)
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS course_details (
+                uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
+                course_number TEXT,
+                course_name TEXT,
+                days_and_times TEXT,
+                room TEXT,
+                instructor TEXT,
+                meeting_dates TEXT
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS course_availabilities (
+                uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
+                status TEXT NOT NULL,
+                course_capacity TEXT,
+                waitlist_capacity TEXT,
+                currently_enrolled TEXT,
+                currently_waitlisted TEXT,
+                available_seats TEXT
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS user_interests (
+                uid INTEGER REFERENCES course_params(uid) ON DELETE CASCADE,
+                user_id TEXT NOT NULL,
+                channel_id TEXT NOT NULL,
+                PRIMARY KEY (uid, user_id)
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS page_fingerprints (
+                uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
+                fingerprint TEXT NOT NULL
+            )
+        """,
+    ],
+    # 2: indexes for get_unique_uid and fetch_user_interests
+    [
+        "CREATE INDEX IF NOT EXISTS idx_course_params_course_base64 ON course_params(course_base64)",
+        "CREATE INDEX IF NOT EXISTS idx_user_interests_user_id ON user_interests(user_id)",
+    ],
+    # 3: seat counts stored as INTEGER instead of TEXT
+    [
+        """
+            CREATE TABLE course_availabilities_new (
+                uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
+                status TEXT NOT NULL,
+                course_capacity INTEGER,
+                waitlist_capacity INTEGER,
+                currently_enrolled INTEGER,
+                currently_waitlisted INTEGER,
+                available_seats INTEGER
+            )
+        """,
+        """
+            INSERT INTO course_availabilities_new
+            SELECT
+                uid,
+                status,
+                CAST(NULLIF(TRIM(course_capacity), '') AS INTEGER),
+                CAST(NULLIF(TRIM(waitlist_capacity), '') AS INTEGER),
+                CAST(NULLIF(TRIM(currently_enrolled), '') AS INTEGER),
+                CAST(NULLIF(TRIM(currently_waitlisted), '') AS INTEGER),
+                CAST(NULLIF(TRIM(available_seats), '') AS INTEGER)
+            FROM course_availabilities
+        """,
+        "DROP TABLE course_availabilities",
+        "ALTER TABLE course_availabilities_new RENAME TO course_availabilities",
+    ],
+    # 4: unix time a watcher's channel was found deleted or inaccessible, NULL while it is alive
+    [
+        "ALTER TABLE user_interests ADD COLUMN dead_since INTEGER",
+    ],
+    # 5: availability history. Each row holds the status plus seat count deltas from the previous row of the same uid,
+    # so a running sum in ts order gives absolute counts. Seeded with the current availabilities as the first rows.
+    [
+        """
+            CREATE TABLE availability_history (
+                uid INTEGER NOT NULL REFERENCES course_params(uid) ON DELETE CASCADE,
+                ts INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                enrolled_delta INTEGER NOT NULL,
+                waitlisted_delta INTEGER NOT NULL,
+                available_delta INTEGER NOT NULL,
+                changes INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (uid, ts)
+            ) WITHOUT ROWID
+        """,
+        """
+            INSERT INTO availability_history (uid, ts, status, enrolled_delta, waitlisted_delta, available_delta)
+            SELECT
+                uid,
+                CAST(strftime('%s', 'now') AS INTEGER),
+                CASE status WHEN 'Closed' THEN 0 WHEN 'Open' THEN 1 WHEN 'Wait List' THEN 2 ELSE -1 END,
+                COALESCE(currently_enrolled, 0),
+                COALESCE(currently_waitlisted, 0),
+                COALESCE(available_seats, 0)
+            FROM course_availabilities
+        """,
+    ],
+    # 6: shard leases shared by every monitor process, owner is NULL for a free shard. Workers heartbeat into
+    # monitor_workers whether or not they hold shards, so a newcomer still counts toward everyone's fair share.
+    [
+        """
+            CREATE TABLE monitor_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL NOT NULL DEFAULT 0
+            )
+        """,
+        """
+            CREATE TABLE monitor_workers (
+                owner TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+        """,
+    ],
+    # 7: notification outbox, one row per status change and channel, written in the same transaction as the change
+    [
+        """
+            CREATE TABLE notification_outbox (
+                id INTEGER PRIMARY KEY,
+                uid INTEGER NOT NULL REFERENCES course_params(uid) ON DELETE CASCADE,
+                channel_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_until REAL NOT NULL DEFAULT 0
+            )
+        """,
+        "CREATE INDEX idx_notification_outbox_next_attempt_at ON notification_outbox(next_attempt_at)",
+    ],
+    # 8: fingerprint of the command tree last synced to each guild, so unchanged guilds are not synced again
+    [
+        """
+            CREATE TABLE command_syncs (
+                guild_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            )
+        """,
+    ],
+]
 
-async def initialize_tables() -> None:
-    async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-        try:
-            await conn.execute("PRAGMA foreign_keys=ON")
 
-            async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS course_params (
-                        uid INTEGER PRIMARY KEY,
-                        course_base64 TEXT NOT NULL,
-                        session TEXT NOT NULL,
-                        term_code TEXT NOT NULL,
-                        institution TEXT NOT NULL,
-                        UNIQUE (course_base64, session, term_code, institution)
-                    )
-                """)
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS course_details (
-                        uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
-                        course_number TEXT,
-                        course_name TEXT,
-                        days_and_times TEXT,
-                        room TEXT,
-                        instructor TEXT,
-                        meeting_dates TEXT
-                    )
-                """)
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS course_availabilities (
-                        uid INTEGER PRIMARY KEY REFERENCES course_params(uid) ON DELETE CASCADE,
-                        status TEXT NOT NULL,
-                        course_capacity TEXT,
-                        waitlist_capacity TEXT,
-                        currently_enrolled TEXT,
-                        currently_waitlisted TEXT,
-                        available_seats TEXT
-                    )
-                """)
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS user_interests (
-                        uid INTEGER REFERENCES course_params(uid) ON DELETE CASCADE,
-                        user_id TEXT NOT NULL,
-                        channel_id TEXT NOT NULL,
-                        PRIMARY KEY (uid, user_id)
-                    )
-                """)
-                await conn.commit()
-                ic("Database successfully initialized.")
+async def get_schema_version(conn: Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
 
+async def initialize_tables(conn: Connection) -> None:
+    # Failures propagate: running on a half-migrated schema would only fail later, quietly, inside the writer tasks
+    version = await get_schema_version(conn)
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Each migration and its version bump commit together, so a crash never leaves a half-applied step
+        await conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(f"PRAGMA user_version = {target}")
+            await conn.commit()
         except Exception as e:
-            ic(f"Error occurred while initializing database: {e}")
+            await conn.rollback()
+            ic(f"Migration to schema version {target} failed, database left at version {target - 1}: {e}")
+            raise
+        ic(f"Database migrated to schema version {target}.")
+    ic("Database successfully initialized.")
 
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass
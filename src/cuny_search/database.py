@@ -0,0 +1,89 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+import aiosqlite
+from aiosqlite import Connection
+from icecream import ic
+from cuny_search.constants import DB_READERS
+
+PRAGMAS: tuple[str, ...] = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+
+class DatabaseManager:
+    def __init__(self, path: Path, readers: int = DB_READERS) -> None:
+        self.path = path
+        self.num_readers = readers
+        self.writer_conn: Connection | None = None
+        self.readers: asyncio.Queue[Connection] = asyncio.Queue()
+        self.reader_conns: list[Connection] = []
+        self.write_lock = asyncio.Lock()
+
+    async def _connect(self) -> Connection:
+        conn = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await self._run_pragma(conn, pragma)
+        return conn
+
+    @staticmethod
+    async def _run_pragma(conn: Connection, pragma: str) -> None:
+        # Pragmas like journal_mode return a row, and an unfinished statement keeps its lock
+        async with conn.execute(pragma) as cursor:
+            await cursor.fetchall()
+
+    async def open(self) -> None:
+        if self.writer_conn is not None:
+            return
+
+        self.writer_conn = await self._connect()
+        # WAL lets the readers keep serving commands while the monitor holds the write lock
+        await self._run_pragma(self.writer_conn, "PRAGMA journal_mode=WAL")
+
+        for _ in range(self.num_readers):
+            conn = await self._connect()
+            self.reader_conns.append(conn)
+            self.readers.put_nowait(conn)
+        ic(f"Database opened with 1 writer and {self.num_readers} reader connections.")
+
+    async def close(self) -> None:
+        if self.writer_conn is None:
+            return
+
+        async with self.write_lock:
+            for conn in self.reader_conns:
+                await conn.close()
+            await self.writer_conn.close()
+
+        self.reader_conns.clear()
+        self.readers = asyncio.Queue()
+        self.writer_conn = None
+        ic("Database connections closed.")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[Connection]:
+        if self.writer_conn is None:
+            raise RuntimeError("Database is not open")
+        async with self.write_lock:
+            try:
+                yield self.writer_conn
+            finally:
+                # A transaction left open would hold SQLite's write lock and leak into the next holder's commit
+                if self.writer_conn.in_transaction:
+                    ic("Rolling back a transaction left open on the writer connection.")
+                    await self.writer_conn.rollback()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[Connection]:
+        if self.writer_conn is None:
+            raise RuntimeError("Database is not open")
+        conn = await self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put_nowait(conn)
@@ -1,43 +1,131 @@
 import asyncio
 import os
+from collections import defaultdict
+from collections.abc import Iterable
 from random import uniform
+from time import monotonic, perf_counter
 from typing import NoReturn
 from dotenv import load_dotenv
-import aiosqlite
-from bs4 import BeautifulSoup
+from aiosqlite import Row
 import discord
 from discord.ext import commands
 from icecream import ic
-from cuny_search import DATA_DIR, refresh_client, initialize_tables, scrape, process
+from cuny_search import DATA_DIR, initialize_tables, process_page_async, shutdown_executor
 from cuny_search import access_db as db
-from cuny_search.models import CourseDetails, CourseAvailabilities, EncodedParams
+from cuny_search.cache import CourseCache
+from cuny_search.constants import BULK_FETCH, BULK_MIN_SECTIONS, FORCE_COMMAND_SYNC, HISTORY_COMPACT_INTERVAL, MONITOR_IN_BOT, PARSE_WORKERS, PIPELINE_QUEUE_SIZE, POLL_MIN_INTERVAL, SCRAPE_WORKERS, WRITE_BATCH_SIZE
+from cuny_search.database import DatabaseManager
+from cuny_search.fingerprints import FingerprintStore, command_tree_fingerprint, page_fingerprint
+from cuny_search.leases import LeaseManager
+from cuny_search.metrics import Metrics
+from cuny_search.models import CourseDetails, CourseAvailabilities, CourseParams, EncodedParams
+from cuny_search.notifications import NotificationDispatcher
+from cuny_search.scheduler import PollScheduler
+from cuny_search.processor import process_listing_async
+from cuny_search.scraper import RequestGovernor, SessionPool, fetch_listing, get_params_key
+from cuny_search.singleflight import SingleFlight
+from cuny_search.supervisor import MonitorSupervisor
+from cuny_search.utils import decode_b64, status_changed
 
 
 class Client(commands.Bot):
     def __init__(self, *, command_prefix: str, intents: discord.Intents) -> None:
         super().__init__(command_prefix=command_prefix, intents=intents)
-        self.scraper = None
-        self.semaphore = asyncio.Semaphore(5)
+        self.governor = RequestGovernor()
+        self.page_flights = SingleFlight()
+        self.course_flights = SingleFlight()
+        self.dispatcher = NotificationDispatcher(self)
+        self.fingerprints = FingerprintStore()
+        self.scheduler = PollScheduler()
+        self.database = DatabaseManager(DATA_DIR/"classes.db")
+        self.metrics = Metrics()
+        self.course_cache = CourseCache(self.metrics)
+        self.sessions = SessionPool(self.metrics)
+        self.leases = LeaseManager(self)
+        # start_monitoring is defined further down, after the module-level client it drives
+        self.supervisor = MonitorSupervisor(self, lambda: start_monitoring())
+        # A headless monitor worker only logs in over HTTP to send notifications, with no gateway or commands
+        self.headless = False
 
-    async def refresh_scraper(self) -> None:
-        if not self.scraper.is_closed:
-            await self.scraper.aclose()
-        self.scraper = await refresh_client()
-        ic("Refreshed scraper client")
+    async def fetch_course_page(self, params: CourseParams | EncodedParams) -> str | None:
+        async def fetch() -> str | None:
+            # Label by institution code either way, whether the params came from a command or the database
+            institution = decode_b64(get_params_key(params)[3])
+            with self.metrics.scrape_seconds.time(institution=institution):
+                html = await self.sessions.fetch(params, self.governor)
+            if html is None:
+                self.metrics.scrape_failures.inc(institution=institution)
+            return html
+
+        return await self.page_flights.do(get_params_key(params), fetch)
+
+    async def fetch_course(self, params: CourseParams | EncodedParams) -> tuple[CourseDetails, CourseAvailabilities]:
+        async def fetch_and_process() -> tuple[CourseDetails, CourseAvailabilities]:
+            html = await self.fetch_course_page(params)
+            if html is None:
+                raise ValueError("Could not reach Global Search.")
+            return await process_page_async(html)
+
+        return await self.course_flights.do(get_params_key(params), fetch_and_process)
 
     async def setup_hook(self) -> None:
+        await self.database.open()
+        async with self.database.writer() as conn:
+            await initialize_tables(conn)
+
+        self.dispatcher.start()
+        self.sessions.start()
+        await self.metrics.start_server()
+        # Started here rather than in on_ready, which fires again after every gateway reconnect
+        if self.headless or MONITOR_IN_BOT:
+            self.supervisor.start()
+        if self.headless:
+            return
+
         await self.load_extension("cuny_search.discord_commands")
-        async for guild in self.fetch_guilds():
-            self.tree.copy_global_to(guild=guild)
-            await self.tree.sync(guild=guild)
+        await self.sync_commands()
 
         # await self.tree.sync()  # Syncs the commands globally (has a rate limit)
 
+    def get_command_fingerprint(self) -> str:
+        return command_tree_fingerprint(command.to_dict(self.tree) for command in self.tree.get_commands())
+
+    async def sync_commands(self) -> None:
+        # Each sync is a rate limited REST call, so guilds already holding this exact command tree are skipped
+        fingerprint = self.get_command_fingerprint()
+        async with self.database.reader() as conn:
+            synced = await db.fetch_command_fingerprints(conn)
+
+        skipped = 0
+        async for guild in self.fetch_guilds():
+            if not FORCE_COMMAND_SYNC and synced.get(guild.id) == fingerprint:
+                self.tree.copy_global_to(guild=guild)
+                skipped += 1
+                continue
+            await self.sync_guild(guild, fingerprint)
+        ic(f"Command tree {fingerprint[:8]}: {skipped} guild(s) already up to date.")
+
+    async def sync_guild(self, guild: discord.abc.Snowflake, fingerprint: str) -> None:
+        self.tree.copy_global_to(guild=guild)
+        await self.tree.sync(guild=guild)
+        async with self.database.writer() as conn:
+            await db.set_command_fingerprint(conn, guild.id, fingerprint)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.sync_guild(guild, self.get_command_fingerprint())
+
+    async def close(self) -> None:
+        await self.supervisor.stop()
+        shutdown_executor()
+        await self.dispatcher.stop()
+        await super().close()
+        await self.sessions.close()
+        await self.leases.release()
+        await self.database.close()
+        await self.metrics.stop_server()
+
     async def on_ready(self) -> None:
-        ic(f"Logged on as {self.user}.")
-        await initialize_tables()
-        self.scraper = await refresh_client()
-        await start_monitoring()
+        ic(f"Logged on as {self.user}, {self.supervisor.live_tasks} monitor task(s) running.")
 
 
 intents = discord.Intents.default()
@@ -45,80 +133,258 @@ intents.message_content = True
 client = Client(command_prefix="!", intents=intents)
 
 
-def status_changed(prev_status: str, new_status: str) -> bool:
-    if prev_status == new_status:
-        return False
-    return "Open" in (prev_status, new_status)
+async def scrape_worker(param_queue: asyncio.Queue, page_queue: asyncio.Queue) -> list[EncodedParams]:
+    failures: list[EncodedParams] = []
+    while True:
+        try:
+            uid, encoded_params = param_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return failures
+
+        try:
+            html = await client.fetch_course_page(encoded_params)
+        except Exception as e:
+            ic(f"Scrape failed for uid={uid}: {e}")
+            html = None
+
+        if not html:
+            failures.append(encoded_params)
+            continue
 
+        # Identical pages cannot change anything, so skip parsing and the DB entirely
+        fingerprint = page_fingerprint(html)
+        if client.fingerprints.is_unchanged(uid, fingerprint):
+            client.scheduler.record(uid, changed=False)
+            client.metrics.pages_unchanged.inc()
+            client.metrics.check_age.mark(uid)
+        else:
+            await page_queue.put((uid, html, fingerprint))
 
-async def start_monitoring() -> NoReturn:
-    while True:
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-            if await db.is_database_empty(conn):
-                ic("Database is empty. Sleeping for 1 minute.")
-                await asyncio.sleep(60)
-                continue
 
-            try:
-                all_course_params = await db.fetch_all_course_params(conn)
-            except Exception as e:
-                ic(f"Error while trying to fetch all course params: {e}")
-                continue
+async def parse_worker(page_queue: asyncio.Queue, result_queue: asyncio.Queue) -> None:
+    while (item := await page_queue.get()) is not None:
+        uid, html, fingerprint = item
+        try:
+            with client.metrics.parse_seconds.time():
+                course_details, course_availabilities = await process_page_async(html)
+            await result_queue.put((uid, course_details, course_availabilities, fingerprint))
+        except Exception as e:
+            client.metrics.parse_failures.inc()
+            ic(f"Processing failed for uid={uid}: {e}")
 
-        uid_soup_pairs: list[tuple[int, BeautifulSoup]] = []
-        for uid, *encoded_params in all_course_params:
-            async with client.semaphore:
-                try:
-                    await asyncio.sleep(uniform(0.01, 0.2))
-                    soup = await scrape(client.scraper, EncodedParams(*encoded_params))
-                    if soup:
-                        uid_soup_pairs.append((uid, soup))
-                except Exception as e:
-                    ic(f"Scrape failed for uid={uid}: {e}")
-                    await client.refresh_scraper()
-
-        all_processed_data: list[tuple[int, CourseDetails, CourseAvailabilities]] = []
-        for uid, soup in uid_soup_pairs:
-            try:
-                course_details, course_availabilities = process(soup)
-                all_processed_data.append((uid, course_details, course_availabilities))
-            except Exception as e:
-                ic(f"Processing failed for uid={uid}: {e}")
 
+async def next_write_batch(result_queue: asyncio.Queue) -> list[tuple[int, CourseDetails, CourseAvailabilities, str]] | None:
+    item = await result_queue.get()
+    if item is None:
+        return None
+
+    # Take whatever else is already waiting so a burst of results shares one transaction
+    batch = [item]
+    while len(batch) < WRITE_BATCH_SIZE:
         try:
-            async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-                await conn.execute("PRAGMA foreign_keys=ON")
-
-                for uid, course_details, course_availabilities in all_processed_data:
-                    prev_status = await db.update_course_availability(conn, uid, course_availabilities)
-                    status = course_availabilities.status
-
-                    if prev_status and status_changed(prev_status, status):
-                        all_users_and_channels = await db.fetch_all_users_and_channels_for_course(conn, uid)
-
-                        if status == "Open":
-                            status_color = "\033[1;32m"
-                        elif status == "Closed":
-                            status_color = "\033[1;31m"
-                        elif status == "Wait List":
-                            status_color = "\033[1;33m"
-                        else:
-                            status_color = "\033[0m"
-
-                        ansi_message = f"{course_details.course_name}-{course_details.course_number} is now {status_color}{status}\033[0m!"
-
-                        for user_id, channel_id in all_users_and_channels:
-                            channel = client.get_channel(int(channel_id))
-                            if not channel:
-                                channel = await client.fetch_channel(int(channel_id))
-                            await channel.send(f"<@{user_id}>\n```ansi\n{ansi_message}\n```")
-                            ic(f"Notified {user_id} in {channel_id} about {course_details.course_name}-{course_details.course_number} being {status}.")
-
-                    ic(f"Course availability updated for: UID: {uid}, {course_details}, {course_availabilities}")
+            item = result_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        if item is None:
+            result_queue.put_nowait(None)
+            break
+        batch.append(item)
+    return batch
+
+
+async def write_worker(result_queue: asyncio.Queue) -> int:
+    written = 0
+    while (batch := await next_write_batch(result_queue)) is not None:
+        availabilities = {uid: course_availabilities for uid, _, course_availabilities, _ in batch}
+        fingerprints = {uid: fingerprint for uid, *_, fingerprint in batch}
+
+        try:
+            async with client.database.writer() as conn:
+                with client.metrics.db_batch_seconds.time():
+                    transitions = await db.update_course_availabilities(conn, availabilities, fingerprints)
         except Exception as e:
             ic(f"An error occured while trying to update the course availability: {e}")
+            continue
+        if transitions is None:
+            continue
+
+        moved = {uid for uid, *_, changed in transitions if changed}
+        for uid, fingerprint in fingerprints.items():
+            client.fingerprints.set(uid, fingerprint)
+            # A new fingerprint can come from markup alone, so only moved status or seats count toward volatility
+            client.scheduler.record(uid, changed=uid in moved)
+            client.course_cache.update_availability(uid, availabilities[uid])
+            client.metrics.check_age.mark(uid)
+        client.metrics.db_rows_written.inc(len(batch))
+        written += len(batch)
+        ic(f"Course availability updated for UIDs: {list(availabilities)}")
+
+        # The alerts are already in the outbox; the sweep never waits on Discord, it only nudges the dispatcher
+        if any(status_changed(prev_status, status) for _, prev_status, status, _ in transitions):
+            client.dispatcher.wake()
+    return written
+
+
+async def run_sweep(all_course_params: Iterable[Row]) -> None:
+    param_queue: asyncio.Queue[tuple[int, EncodedParams]] = asyncio.Queue()
+    for uid, *encoded_params in all_course_params:
+        param_queue.put_nowait((uid, EncodedParams(*encoded_params)))
+    total = param_queue.qsize()
+
+    # Bounded queues keep at most a handful of pages in memory regardless of how many courses are tracked
+    page_queue: asyncio.Queue[tuple[int, str, str] | None] = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    result_queue: asyncio.Queue[tuple[int, CourseDetails, CourseAvailabilities, str] | None] = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    sweep_start = perf_counter()
+    # If any stage dies the group cancels the rest, so producers never block on a queue nobody drains
+    async with asyncio.TaskGroup() as group:
+        writer = group.create_task(write_worker(result_queue))
+        parsers = [group.create_task(parse_worker(page_queue, result_queue)) for _ in range(PARSE_WORKERS)]
+        scrapers = [group.create_task(scrape_worker(param_queue, page_queue)) for _ in range(SCRAPE_WORKERS)]
+
+        await asyncio.wait(scrapers)
+        for _ in parsers:
+            await page_queue.put(None)
+        await asyncio.wait(parsers)
+        await result_queue.put(None)
+
+    written = writer.result()
+    failures = [params for scraper in scrapers for params in scraper.result()]
+
+    sweep_time = perf_counter() - sweep_start
+    client.metrics.sweep_seconds.observe(sweep_time)
+    ic(
+        f"Sweep finished in {sweep_time:.2f}s: {written}/{total} courses updated, {len(failures)} scrape failures, "
+        f"{client.fingerprints.hits} unchanged pages skipped so far ({client.fingerprints.hit_rate():.0%} hit rate), "
+        f"request governor: {client.governor.snapshot()}."
+    )
+
+
+async def check_listing(subject: str, rows: list[Row], listing_info: dict[int, Row]) -> list[Row]:
+    if len(rows) < BULK_MIN_SECTIONS:
+        return rows
+
+    session = await client.sessions.get(EncodedParams(*rows[0][1:]))
+    html = await fetch_listing(session, subject, client.governor)
+    statuses = await process_listing_async(html) if html else {}
+
+    # Sections missing from the listing, or whose status moved, still get their detail page fetched
+    changed: list[Row] = []
+    for row in rows:
+        uid = row[0]
+        _, course_number, _, status = listing_info[uid]
+        if statuses.get(course_number) == status:
+            client.scheduler.record(uid, changed=False)
+            client.metrics.check_age.mark(uid)
+        else:
+            changed.append(row)
+    return changed
+
+
+async def filter_by_listings(due_rows: list[Row]) -> list[Row]:
+    async with client.database.reader() as conn:
+        listing_info = {row[0]: row for row in await db.fetch_listing_info(conn)}
+
+    remaining: list[Row] = []
+    groups: dict[tuple[str, str, str], list[Row]] = defaultdict(list)
+    for row in due_rows:
+        uid, _, _, term_code, institution = row
+        info = listing_info.get(uid)
+        if info is None or not info[2]:
+            remaining.append(row)
+            continue
+        subject = info[2].split()[0]
+        groups[(institution, term_code, subject)].append(row)
+
+    results = await asyncio.gather(
+        *(check_listing(subject, rows, listing_info) for (_, _, subject), rows in groups.items()),
+        return_exceptions=True
+    )
+    for rows, result in zip(groups.values(), results):
+        if isinstance(result, BaseException):
+            ic(f"Listing check failed, falling back to detail pages: {result}")
+            remaining.extend(rows)
+        else:
+            remaining.extend(result)
+
+    ic(f"Listings cleared {len(due_rows) - len(remaining)}/{len(due_rows)} due sections without a detail fetch.")
+    return remaining
+
+
+async def compact_history() -> None:
+    try:
+        async with client.database.writer() as conn:
+            removed = await db.compact_availability_history(conn)
+        ic(f"Compacted availability history, {removed} rows merged.")
+    except Exception as e:
+        ic(f"Error while trying to compact availability history: {e}")
+
+
+async def start_monitoring() -> NoReturn:
+    client.leases.start()
+    last_compaction: float | None = None
+    while True:
+        if client.sessions.breaker.state == "open":
+            # Global Search is down, so due courses stay due until the breaker lets a probe request through
+            await asyncio.sleep(client.sessions.breaker.seconds_until_probe())
+            continue
+
+        try:
+            async with client.database.reader() as conn:
+                is_empty = await db.is_database_empty(conn)
+                if not is_empty:
+                    # Only the shards this process currently leases; other workers poll the rest
+                    all_course_params = [row for row in await db.fetch_all_course_params(conn) if client.leases.owns(row[0])]
+                    client.scheduler.sync(row for row in await db.fetch_polling_stats(conn) if client.leases.owns(row[0]))
+                    client.metrics.check_age.forget_missing({row[0] for row in all_course_params})
+        except Exception as e:
+            ic(f"Error while trying to fetch all course params: {e}")
+            await asyncio.sleep(uniform(3, 8))
+            continue
+
+        if is_empty:
+            ic("Database is empty. Sleeping for 1 minute.")
+            await asyncio.sleep(60)
+            continue
+
+        due = set(client.scheduler.pop_due())
+        if due:
+            try:
+                due_rows = [row for row in all_course_params if row[0] in due]
+                if BULK_FETCH:
+                    due_rows = await filter_by_listings(due_rows)
+                if due_rows:
+                    await run_sweep(due_rows)
+            finally:
+                client.scheduler.release(due)
+
+        # One worker compacts for everyone: whichever holds shard 0
+        if client.leases.owns(0) and (last_compaction is None or monotonic() - last_compaction >= HISTORY_COMPACT_INTERVAL):
+            await compact_history()
+            last_compaction = monotonic()
+
+        # Wake up for the next due course, but often enough to pick up newly added ones
+        await asyncio.sleep(min(max(client.scheduler.seconds_until_next(), 1), POLL_MIN_INTERVAL))
+
+
+async def run_worker(token: str) -> None:
+    client.headless = True
+    async with client:
+        await client.login(token)
+        await client.supervisor.wait()
+
+
+def start_worker() -> None:
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        ic("Discord token not found! Cannot start monitor worker.")
+        return
 
-        await asyncio.sleep(uniform(3, 8))
+    try:
+        asyncio.run(run_worker(token))
+    except KeyboardInterrupt:
+        ic("Monitor worker stopped.")
 
 
 def start_bot() -> None:
@@ -1,11 +1,20 @@
-import aiosqlite
+from collections import Counter
+from datetime import datetime
+from time import time
 from discord import Interaction, app_commands
 from discord.ext import commands
 from icecream import ic
-from cuny_search import DATA_DIR, process, scrape
 from cuny_search import access_db as db
-from cuny_search.constants import AMBIGUOUS, COURSE_NUMBERS, INSTITUTIONS, NOT_FOUND, SESSIONS, TERMS, YEARS
+from cuny_search.constants import AMBIGUOUS, COURSE_NUMBERS, HISTORY_DAYS, INSTITUTIONS, NOT_FOUND, SESSIONS, TERMS, YEARS
 from cuny_search.models import CourseParams, UserInterests
+from cuny_search.utils import get_status_code, get_status_name
+
+
+async def send_deferred(interaction: Interaction, message: str, ephemeral: bool = False) -> None:
+    # The first followup after defer() fills in the public "thinking" message, so a private reply replaces it instead
+    if ephemeral:
+        await interaction.delete_original_response()
+    await interaction.followup.send(message, ephemeral=ephemeral)
 
 
 class CourseCommands(commands.Cog):
@@ -20,47 +29,37 @@ class CourseCommands(commands.Cog):
     @app_commands.describe(institution="Name of the college. Defaults to 'Queens College'.")
     async def add_course(self, interaction: Interaction, course_number: COURSE_NUMBERS, term: TERMS, year: YEARS, institution: INSTITUTIONS, session: SESSIONS) -> None:
         course_params = CourseParams(course_number, term, year, session, institution)
+        # The fetch queues behind the monitor's requests and may prime a session, which can outlast Discord's 3s deadline
+        await interaction.response.defer()
         try:
-            soup = await scrape(self.bot.scraper, course_params)
-            course_details, course_availabilities = process(soup)
+            course_details, course_availabilities = await self.bot.fetch_course(course_params)
 
             if course_details.course_number != str(course_number):
                 raise ValueError(f"Mismatched course number: expected {course_number}, got {course_details.course_number}. Ensure all fields are accurate.")
         except Exception as e:
             ic(f"An error occured while trying to add a new course: {e}")
-            await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
-            await self.bot.refresh_scraper()
+            await send_deferred(interaction, f"An error occurred: {e}", ephemeral=True)
             return
 
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-            await conn.execute("PRAGMA foreign_keys=ON")
-
+        # Replies are sent after the writer is released, so a slow Discord round-trip never holds up monitor writes
+        message, ephemeral = f"```Added {course_number} to your tracked courses.```", False
+        async with self.bot.database.writer() as conn:
             try:
                 uid = await db.add_course_params_and_get_uid(conn, course_params)
-            except Exception as e:
-                ic(f"An error occured while trying to access the DB to verify course exists: {e}")
-                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
-                return
-
-            try:
                 is_already_added = await db.is_course_in_user_interests(conn, uid, interaction.user.id)
-            except Exception as e:
-                ic(f"An error occured while trying to access the DB to check if user already added the course: {e}")
-                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
-                return
-
-            if is_already_added:
-                await interaction.response.send_message(f"You are already tracking this course!", ephemeral=True)
-                return
-
-            try:
-                await db.add_course_details(conn, uid, course_details)
-                await db.add_course_availability(conn, uid, course_availabilities)
-                await db.add_user_interest(conn, UserInterests(uid, interaction.user.id, interaction.channel.id))
-                await interaction.response.send_message(f"```Added {course_number} to your tracked courses.```")
+                if is_already_added:
+                    message, ephemeral = "You are already tracking this course!", True
+                else:
+                    await db.add_course_details(conn, uid, course_details)
+                    await db.add_course_availability(conn, uid, course_availabilities)
+                    await db.add_user_interest(conn, UserInterests(uid, interaction.user.id, interaction.channel.id))
+                    # A new course can change how partial params resolve, so start the cache over
+                    self.bot.course_cache.clear()
             except Exception as e:
                 ic(f"An error occured while trying to add a new user interest: {e}")
-                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+                message, ephemeral = f"An error occurred: {e}", True
+
+        await send_deferred(interaction, message, ephemeral=ephemeral)
 
 
     @app_commands.command(name="remove_course", description="Stop tracking a course.")
@@ -72,24 +71,25 @@ class CourseCommands(commands.Cog):
     async def remove_course(self, interaction: Interaction, course_number: COURSE_NUMBERS, term: TERMS, year: YEARS, institution: INSTITUTIONS, session: SESSIONS) -> None:
         course_params = CourseParams(course_number, term, year, session, institution)
 
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-            await conn.execute("PRAGMA foreign_keys=ON")
-
+        error: str | None = None
+        async with self.bot.database.writer() as conn:
             try:
                 num_remaining = await db.remove_user_interest(conn, course_params, interaction.user.id)
                 if num_remaining == AMBIGUOUS:
-                    await interaction.response.send_message("Multiple classes found with that course number, please fill out full details.", ephemeral=True)
-                    return
-
-                if num_remaining == NOT_FOUND:
+                    error = "Multiple classes found with that course number, please fill out full details."
+                elif num_remaining == NOT_FOUND:
                     raise ValueError("Did not find course when querying database.")
             except Exception as e:
                 ic(f"An error occured while accessing the DB to remove a course: {e}")
-                await interaction.response.send_message(f"An error occured: {e}", ephemeral=True)
-                return
+                error = f"An error occured: {e}"
+
+        if error is not None:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
 
         message = f"```Successfully removed {course_number}."
         if num_remaining == 0:
+            self.bot.course_cache.clear()
             message += "\nNo one else was tracking this course, so it was removed from the database."
         message += "```"
         await interaction.response.send_message(message)
@@ -103,15 +103,21 @@ class CourseCommands(commands.Cog):
     @app_commands.describe(institution="Name of the college. Defaults to 'Queens College'.")
     async def get_course_availability(self, interaction: Interaction, course_number: COURSE_NUMBERS, term: TERMS, year: YEARS, institution: INSTITUTIONS, session: SESSIONS) -> None:
         course_params = CourseParams(course_number, term, year, session, institution)
-        course_availability = None
-
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-            try:
-                course_availability = await db.get_course_availability(conn, course_params)
-            except Exception as e:
-                ic(f"An error occured while trying to access the DB for course availability: {e}")
-                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
-                return
+        cache_key = course_params.get_encoded_tuple()
+        # The cache only sees writes made by this process, so it is trusted only while this process monitors every shard
+        use_cache = self.bot.leases.owns_all()
+        course_availability = self.bot.course_cache.get_availability(cache_key) if use_cache else None
+
+        if course_availability is None:
+            async with self.bot.database.reader() as conn:
+                try:
+                    course_availability = await db.get_course_availability(conn, course_params)
+                except Exception as e:
+                    ic(f"An error occured while trying to access the DB for course availability: {e}")
+                    await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+                    return
+            if course_availability and use_cache:
+                self.bot.course_cache.set_availability(cache_key, course_availability)
 
         if course_availability:
             _, status, course_capacity, waitlist_capacity, currently_enrolled, currently_waitlisted, available_seats = course_availability
@@ -124,7 +130,7 @@ class CourseCommands(commands.Cog):
                 status_color = "\033[1;33m"
             else:
                 status_color = "\033[0m"
-            seats_color = "\033[1;32m" if int(available_seats) > 0 else "\033[1;31m"
+            seats_color = "\033[1;32m" if available_seats and available_seats > 0 else "\033[1;31m"
 
             message = (
                 f"\033[1;36mStatus:\033[0m {status_color}{status}\033[0m\n"
@@ -145,15 +151,19 @@ class CourseCommands(commands.Cog):
     @app_commands.describe(institution="Name of the college. Defaults to 'Queens College'.")
     async def get_course_details(self, interaction: Interaction, course_number: COURSE_NUMBERS, term: TERMS, year: YEARS, institution: INSTITUTIONS, session: SESSIONS) -> None:
         course_params = CourseParams(course_number, term, year, session, institution)
-        course_details = None
-
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
-            try:
-                course_details = await db.get_course_details(conn, course_params)
-            except Exception as e:
-                ic(f"An error occured while trying to access the DB for course availability: {e}")
-                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
-                return
+        cache_key = course_params.get_encoded_tuple()
+        course_details = self.bot.course_cache.get_details(cache_key)
+
+        if course_details is None:
+            async with self.bot.database.reader() as conn:
+                try:
+                    course_details = await db.get_course_details(conn, course_params)
+                except Exception as e:
+                    ic(f"An error occured while trying to access the DB for course availability: {e}")
+                    await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+                    return
+            if course_details:
+                self.bot.course_cache.set_details(cache_key, course_details)
 
         if course_details:
             _, _, course_name, days_and_times, room, instructor, meeting_dates = course_details
@@ -168,9 +178,56 @@ class CourseCommands(commands.Cog):
             await interaction.response.send_message("Class not found in database!", ephemeral=True)
 
 
+    @app_commands.command(name="course_history", description="Shows how a course's status and seats changed over time.")
+    @app_commands.describe(course_number="Class number that can be found on Global Search or Schedule Builder.")
+    @app_commands.describe(days="How many days back to look. Defaults to 30.")
+    @app_commands.describe(term="Defaults to current term.")
+    @app_commands.describe(year="Defaults to current year.")
+    @app_commands.describe(session="Typically required for Summer or Winter courses. Defaults to 'Regular Academic Session'.")
+    @app_commands.describe(institution="Name of the college. Defaults to 'Queens College'.")
+    async def course_history(self, interaction: Interaction, course_number: COURSE_NUMBERS, days: HISTORY_DAYS, term: TERMS, year: YEARS, institution: INSTITUTIONS, session: SESSIONS) -> None:
+        course_params = CourseParams(course_number, term, year, session, institution)
+        days = days or 30
+
+        async with self.bot.database.reader() as conn:
+            try:
+                rows = await db.fetch_availability_history(conn, course_params, int(time() - days*24*60*60))
+            except Exception as e:
+                ic(f"An error occured while trying to access the DB for course history: {e}")
+                await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+                return
+
+        if rows is None:
+            await interaction.response.send_message("Class not found in database!", ephemeral=True)
+            return
+        if not rows:
+            await interaction.response.send_message(f"```No changes recorded for {course_number} in the last {days} days.```")
+            return
+
+        open_code = get_status_code("Open")
+        openings = [datetime.fromtimestamp(row[0]) for row in rows if row[1] == open_code and row[6] != open_code]
+        lines = [f"\033[1;36mSeats opened\033[0m {len(openings)} time(s) in the last {days} days."]
+        if openings:
+            weekday, _ = Counter(opened.strftime("%A") for opened in openings).most_common(1)[0]
+            hour, _ = Counter(opened.hour for opened in openings).most_common(1)[0]
+            lines.append(f"\033[1;36mMost often:\033[0m {weekday}s, around {datetime(2000, 1, 1, hour).strftime('%I %p').lstrip('0')}.")
+
+        lines.append("")
+        # Only the latest changes fit in one message
+        for ts, status_code, changes, enrolled, waitlisted, available, _ in rows[-15:]:
+            merged = f" ({changes} changes)" if changes > 1 else ""
+            lines.append(
+                f"{datetime.fromtimestamp(ts).strftime('%a %m/%d %I:%M %p')}  {get_status_name(status_code):<9} "
+                f"{enrolled} enrolled, {available} seats, {waitlisted} waitlisted{merged}"
+            )
+
+        ansi_block = "```ansi\n" + "\n".join(lines) + "\n```"
+        await interaction.response.send_message(ansi_block)
+
+
     @app_commands.command(name="get_my_tracked_courses", description="Returns all the courses you are tracking.")
     async def get_my_tracked_courses(self, interaction: Interaction) -> None:
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
+        async with self.bot.database.reader() as conn:
             try:
                 rows = await db.fetch_user_interests(conn, interaction.user.id)
                 if rows:
@@ -194,7 +251,7 @@ class CourseCommands(commands.Cog):
 
     @app_commands.command(name="fetch_all_courses_tracked_by_bot", description="Returns all the courses the bot is tracking for everyone.")
     async def fetch_all_courses_tracked_by_bot(self, interaction: Interaction) -> None:
-        async with aiosqlite.connect(DATA_DIR/"classes.db") as conn:
+        async with self.bot.database.reader() as conn:
             try:
                 rows = await db.fetch_all_course_numbers_and_names(conn)
                 if rows:
@@ -211,8 +268,54 @@ class CourseCommands(commands.Cog):
                 await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
 
 
+class AdminCommands(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(name="metrics", description="Summarizes monitor latencies and data staleness.")
+    @app_commands.default_permissions(administrator=True)
+    async def metrics(self, interaction: Interaction) -> None:
+        metrics = self.bot.metrics
+        lines: list[str] = ["\u001b[1;36mStage            count      p50      p95      p99\u001b[0m"]
+        for stage, histogram in metrics.histograms.items():
+            for labels, (count, p50, p95, p99) in sorted(histogram.summary().items()):
+                name = f"{stage} {labels[0][1]}" if labels else stage
+                lines.append(f"{name[:16]:<16}{count:>6} {p50:>7.3f}s {p95:>7.3f}s {p99:>7.3f}s")
+
+        ages = metrics.check_age.ages()
+        if ages:
+            ages.sort()
+            lines.append(
+                f"\n\u001b[1;36mLast checked:\u001b[0m {len(ages)} courses, median {ages[len(ages)//2]:.0f}s ago, "
+                f"oldest {ages[-1]:.0f}s ago"
+            )
+        lines.append(
+            f"\u001b[1;36mFailures:\u001b[0m {metrics.scrape_failures.total():.0f} scrapes, {metrics.parse_failures.total():.0f} parses, "
+            f"{metrics.notification_failures.total():.0f} notifications; {metrics.pages_unchanged.total():.0f} unchanged pages skipped"
+        )
+
+        lines.append(
+            f"\u001b[1;36mMonitor:\u001b[0m {self.bot.supervisor.live_tasks} task(s) running, "
+            f"{self.bot.supervisor.restarts} restart(s)"
+        )
+        lines.append(
+            f"\u001b[1;36mSessions:\u001b[0m {len(self.bot.sessions.sessions)} pooled, "
+            f"{metrics.session_refreshes.total():.0f} refresh(es), circuit breaker {self.bot.sessions.breaker.state}"
+        )
+        lookups = metrics.cache_lookups.total()
+        hits = sum(value for labels, value in metrics.cache_lookups.values.items() if ("result", "hit") in labels)
+        lines.append(
+            f"\u001b[1;36mCache:\u001b[0m {metrics.cache_entries.value:.0f} entries, "
+            f"{hits:.0f}/{lookups:.0f} lookups hit ({hits/lookups if lookups else 0:.0%})"
+        )
+
+        ansi_block = "```ansi\n" + "\n".join(lines) + "\n```"
+        await interaction.response.send_message(ansi_block, ephemeral=True)
+
+
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(CourseCommands(bot))
+    await bot.add_cog(AdminCommands(bot))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+import json
+from collections.abc import Callable, Iterable
+from hashlib import blake2b
+from typing import Any
+from aiosqlite import Row
+
+
+def page_fingerprint(html: str) -> str:
+    # Everything before the class detail shadowbox is navigation and per-request markup
+    start = html.find("shadowbox")
+    relevant = html[start:] if start != -1 else html
+    return blake2b(relevant.encode(), digest_size=16).hexdigest()
+
+
+def command_tree_fingerprint(commands: Iterable[dict[str, Any]]) -> str:
+    # commands are the payloads tree.sync would upload, so any change Discord would see changes the fingerprint
+    payload = sorted(commands, key=lambda command: (command.get("type", 1), command["name"]))
+    return blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+class FingerprintStore:
+    def __init__(self) -> None:
+        self.fingerprints: dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, rows: Iterable[Row]) -> None:
+        self.fingerprints.update((uid, fingerprint) for uid, fingerprint in rows)
+
+    def forget(self, predicate: Callable[[int], bool]) -> None:
+        self.fingerprints = {uid: fingerprint for uid, fingerprint in self.fingerprints.items() if not predicate(uid)}
+
+    def is_unchanged(self, uid: int, fingerprint: str) -> bool:
+        if self.fingerprints.get(uid) == fingerprint:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def set(self, uid: int, fingerprint: str) -> None:
+        self.fingerprints[uid] = fingerprint
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
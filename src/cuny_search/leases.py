@@ -0,0 +1,86 @@
+import asyncio
+from time import monotonic, time
+import discord
+from icecream import ic
+from cuny_search import access_db as db
+from cuny_search.constants import LEASE_TTL, MONITOR_SHARDS
+from cuny_search.utils import get_worker_id
+
+
+class LeaseManager:
+    def __init__(self, bot: discord.Client, shards: int = MONITOR_SHARDS, ttl: float = LEASE_TTL) -> None:
+        self.bot = bot
+        self.shards = shards
+        self.ttl = ttl
+        self.owner = get_worker_id()
+        self.owned: frozenset[int] = frozenset()
+        # Local deadline for the leases we hold, so a worker that cannot reach the DB stops polling on its own
+        self.valid_until = 0.0
+        self.task: asyncio.Task | None = None
+
+    def get_shard(self, uid: int) -> int:
+        return uid % self.shards
+
+    def owns(self, uid: int) -> bool:
+        return monotonic() < self.valid_until and self.get_shard(uid) in self.owned
+
+    def owns_all(self) -> bool:
+        return monotonic() < self.valid_until and len(self.owned) == self.shards
+
+    async def renew(self) -> None:
+        started = monotonic()
+        async with self.bot.database.writer() as conn:
+            owned = await db.renew_leases(conn, self.owner, self.shards, self.ttl, time())
+        if owned is None:
+            return
+
+        owned = frozenset(owned)
+        if owned != self.owned:
+            ic(f"Monitor {self.owner} now holds {len(owned)}/{self.shards} shards: {sorted(owned)}")
+        # After a lapse another worker may have held every shard in the meantime, so none of them count as kept
+        kept = self.owned if started < self.valid_until else frozenset()
+        if owned != kept:
+            await self.sync_caches(owned - kept, self.owned - owned)
+        self.owned = owned
+        self.valid_until = started + self.ttl
+
+    async def sync_caches(self, acquired: frozenset[int], released: frozenset[int]) -> None:
+        # Other workers wrote these shards while this process did not hold them, so anything cached for them is stale
+        changed = acquired | released
+        self.bot.fingerprints.forget(lambda uid: self.get_shard(uid) in changed)
+        if acquired:
+            async with self.bot.database.reader() as conn:
+                self.bot.fingerprints.load(await db.fetch_page_fingerprints(conn, self.shards, acquired))
+        self.bot.course_cache.clear()
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        # Renewing three times per TTL leaves room for a slow or failed renewal before anyone else can take over
+        while True:
+            try:
+                await self.renew()
+            except Exception as e:
+                ic(f"Error while trying to renew monitor leases: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    async def release(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+        self.owned = frozenset()
+        self.valid_until = 0.0
+        # Handing the shards back right away saves the other workers waiting out the TTL
+        try:
+            async with self.bot.database.writer() as conn:
+                await db.release_leases(conn, self.owner)
+        except Exception as e:
+            ic(f"Error while trying to release monitor leases: {e}")
@@ -0,0 +1,204 @@
+from bisect import bisect_left
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+from typing import TYPE_CHECKING
+from icecream import ic
+from cuny_search.constants import METRICS_HOST, METRICS_PORT, METRICS_SAMPLE_SIZE
+
+# aiohttp.web is only loaded once the endpoint is actually started
+if TYPE_CHECKING:
+    from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+AGE_QUANTILES = (0.5, 0.9, 0.99, 1)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def percentile(samples: list[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(q*len(samples)), len(samples) - 1)]
+
+
+class Counter:
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.values: dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self.values[tuple(sorted(labels.items()))] += amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts: dict[Labels, list[int]] = {}
+        self.sums: dict[Labels, float] = defaultdict(float)
+        # Prometheus only gets the buckets; the admin summary reads percentiles off the most recent samples
+        self.samples: dict[Labels, deque[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        if key not in self.counts:
+            self.counts[key] = [0]*(len(self.buckets) + 1)
+            self.samples[key] = deque(maxlen=METRICS_SAMPLE_SIZE)
+        self.counts[key][bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+        self.samples[key].append(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def summary(self) -> dict[Labels, tuple[int, float, float, float]]:
+        # Count plus p50/p95/p99 over the recent samples, per label set
+        return {
+            labels: (sum(self.counts[labels]), *(percentile(list(samples), q) for q in (0.5, 0.95, 0.99)))
+            for labels, samples in self.samples.items() if samples
+        }
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {self.sums[labels]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+class CheckAges:
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.last_checked: dict[int, float] = {}
+
+    def mark(self, uid: int) -> None:
+        self.last_checked[uid] = monotonic()
+
+    def forget_missing(self, uids: set[int]) -> None:
+        for uid in self.last_checked.keys() - uids:
+            del self.last_checked[uid]
+
+    def ages(self) -> list[float]:
+        now = monotonic()
+        return [now - checked for checked in self.last_checked.values()]
+
+    def render(self) -> list[str]:
+        # One series per course would be unbounded, so staleness is exported as a summary over all courses
+        ages = self.ages()
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} summary"]
+        if ages:
+            for q in AGE_QUANTILES:
+                lines.append(f'{self.name}{{quantile="{q}"}} {percentile(ages, q)}')
+        lines.append(f"{self.name}_sum {sum(ages)}")
+        lines.append(f"{self.name}_count {len(ages)}")
+        return lines
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.scrape_seconds = Histogram("cuny_scrape_seconds", "Time to fetch a class detail page, by institution.")
+        self.scrape_failures = Counter("cuny_scrape_failures_total", "Class detail fetches that returned no page, by institution.")
+        self.session_refreshes = Counter("cuny_session_refreshes_total", "Global Search sessions primed, by reason.")
+        self.circuit_open = Gauge("cuny_scrape_circuit_open", "1 while the circuit breaker is keeping requests off Global Search.")
+        self.pages_unchanged = Counter("cuny_pages_unchanged_total", "Fetched pages skipped because their fingerprint matched.")
+        self.parse_seconds = Histogram("cuny_parse_seconds", "Time to parse a class detail page, including the parser pool hop.")
+        self.parse_failures = Counter("cuny_parse_failures_total", "Class detail pages that failed to parse.")
+        self.db_batch_seconds = Histogram("cuny_db_batch_seconds", "Time to write one batch of availabilities.")
+        self.db_rows_written = Counter("cuny_db_rows_written_total", "Course availabilities written to the database.")
+        self.notification_seconds = Histogram("cuny_notification_seconds", "Time to deliver the notifications for one channel.")
+        self.notification_failures = Counter("cuny_notification_failures_total", "Channel deliveries that failed.")
+        self.sweep_seconds = Histogram(
+            "cuny_sweep_seconds", "Time for one sweep of the monitor loop.", buckets=(1, 5, 10, 30, 60, 120, 300, 600)
+        )
+        self.monitor_tasks = Gauge("cuny_monitor_tasks", "Monitor loop tasks currently running in this process.")
+        self.monitor_restarts = Counter("cuny_monitor_restarts_total", "Times the monitor loop was restarted after a crash.")
+        self.cache_lookups = Counter("cuny_course_cache_lookups_total", "Course cache lookups from commands, by cache and result.")
+        self.cache_entries = Gauge("cuny_course_cache_entries", "Rows currently held in the course cache.")
+        self.check_age = CheckAges("cuny_course_check_age_seconds", "Seconds since each course was last checked successfully.")
+        self.server: "web.AppRunner | None" = None
+
+    @property
+    def histograms(self) -> dict[str, Histogram]:
+        return {
+            "Scrape": self.scrape_seconds,
+            "Parse": self.parse_seconds,
+            "DB batch": self.db_batch_seconds,
+            "Notify": self.notification_seconds,
+            "Sweep": self.sweep_seconds,
+        }
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in vars(self).values():
+            if isinstance(metric, (Counter, Gauge, Histogram, CheckAges)):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start_server(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        if not port or self.server is not None:
+            return
+
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.server = web.AppRunner(app, access_log=None)
+        await self.server.setup()
+        try:
+            await web.TCPSite(self.server, host, port).start()
+        except OSError as e:
+            ic(f"Could not start the metrics endpoint on {host}:{port}: {e}")
+            await self.stop_server()
+            return
+        ic(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop_server(self) -> None:
+        if self.server is not None:
+            await self.server.cleanup()
+            self.server = None
@@ -61,11 +61,11 @@ class CourseDetails:
 @dataclass
 class CourseAvailabilities:
     status: str
-    course_capacity: str
-    waitlist_capacity: str
-    currently_enrolled: str
-    currently_waitlisted: str
-    available_seats: str
+    course_capacity: int
+    waitlist_capacity: int
+    currently_enrolled: int
+    currently_waitlisted: int
+    available_seats: int
 
 
 @dataclass
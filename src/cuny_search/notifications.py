@@ -0,0 +1,242 @@
+import asyncio
+from collections import defaultdict
+from time import monotonic, time
+from typing import Any
+import discord
+from aiosqlite import Row
+from icecream import ic
+from cuny_search import access_db as db
+from cuny_search.constants import (
+    CHANNEL_FAILURE_TTL,
+    DEAD_INTEREST_RETENTION,
+    MESSAGE_CHAR_LIMIT,
+    NOTIFY_CONCURRENCY,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_CLAIM_TTL,
+    OUTBOX_MAX_AGE,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+    PRUNE_INTERVAL
+)
+from cuny_search.utils import get_worker_id
+
+
+def format_status_message(course_name: str, course_number: str, status: str) -> str:
+    if status == "Open":
+        status_color = "\033[1;32m"
+    elif status == "Closed":
+        status_color = "\033[1;31m"
+    elif status == "Wait List":
+        status_color = "\033[1;33m"
+    else:
+        status_color = "\033[0m"
+
+    return f"{course_name}-{course_number} is now {status_color}{status}\033[0m!"
+
+
+def build_messages(ansi_messages: list[tuple[str, list[int]]]) -> list[str]:
+    # Each status change becomes "<@a> <@b> ...\n```ansi ...```", split if the mentions overflow one message,
+    # and then as many of those blocks as fit are packed into each message
+    blocks: list[str] = []
+    for ansi_message, user_ids in ansi_messages:
+        code_block = f"\n```ansi\n{ansi_message}\n```"
+        mentions: list[str] = []
+        for user_id in user_ids:
+            mention = f"<@{user_id}>"
+            if mentions and len(" ".join(mentions)) + 1 + len(mention) + len(code_block) > MESSAGE_CHAR_LIMIT:
+                blocks.append(" ".join(mentions) + code_block)
+                mentions = []
+            mentions.append(mention)
+        if mentions:
+            blocks.append(" ".join(mentions) + code_block)
+
+    messages: list[str] = []
+    for block in blocks:
+        if messages and len(messages[-1]) + 1 + len(block) <= MESSAGE_CHAR_LIMIT:
+            messages[-1] += "\n" + block
+        else:
+            messages.append(block)
+    return messages
+
+
+class ChannelResolver:
+    def __init__(self, bot: discord.Client, failure_ttl: float = CHANNEL_FAILURE_TTL) -> None:
+        self.bot = bot
+        self.failure_ttl = failure_ttl
+        self.channels: dict[int, Any] = {}
+        self.failures: dict[int, float] = {}
+        self.dead: set[int] = set()
+        # Channels that are gone for good (deleted or no access), waiting to be marked in user_interests
+        self.newly_dead: set[int] = set()
+        self.newly_alive: set[int] = set()
+
+    async def resolve(self, channel_id: int) -> Any | None:
+        channel = self.channels.get(channel_id) or self.bot.get_channel(channel_id)
+        if channel:
+            self.channels[channel_id] = channel
+            return channel
+
+        failed_at = self.failures.get(channel_id)
+        if failed_at is not None and monotonic() - failed_at < self.failure_ttl:
+            return None
+
+        try:
+            channel = await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden) as e:
+            self.mark_dead(channel_id)
+            ic(f"Channel {channel_id} is no longer reachable: {e}")
+            return None
+        except Exception as e:
+            self.failures[channel_id] = monotonic()
+            ic(f"Error while trying to fetch channel {channel_id}: {e}")
+            return None
+
+        self.channels[channel_id] = channel
+        self.dead.discard(channel_id)
+        if self.failures.pop(channel_id, None) is not None:
+            self.newly_alive.add(channel_id)
+        return channel
+
+    def mark_dead(self, channel_id: int) -> None:
+        self.channels.pop(channel_id, None)
+        self.failures[channel_id] = monotonic()
+        self.dead.add(channel_id)
+        self.newly_dead.add(channel_id)
+        self.newly_alive.discard(channel_id)
+
+
+class NotificationDispatcher:
+    def __init__(self, bot: discord.Client, concurrency: int = NOTIFY_CONCURRENCY) -> None:
+        self.bot = bot
+        self.owner = get_worker_id()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.resolver = ChannelResolver(bot)
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.last_prune = 0.0
+
+    def wake(self) -> None:
+        # Called after new alerts commit so they go out without waiting for the next poll
+        self.wakeup.set()
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self) -> None:
+        # Drains the outbox in every process that sends alerts, bot or headless worker alike
+        while True:
+            try:
+                claimed = await self.drain()
+            except Exception as e:
+                ic(f"Error while trying to drain the notification outbox: {e}")
+                claimed = 0
+            await self.flush_channel_health()
+
+            if claimed < OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+    async def drain(self) -> int:
+        now = time()
+        async with self.bot.database.writer() as conn:
+            expired = await db.expire_outbox_rows(conn, now - OUTBOX_MAX_AGE, now)
+            rows = await db.claim_outbox(conn, self.owner, now, OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_TTL)
+        if expired:
+            ic(f"Dropped {expired} notification(s) still undelivered after {OUTBOX_MAX_AGE:.0f}s.")
+        if not rows:
+            return 0
+
+        by_channel: dict[int, list[Row]] = defaultdict(list)
+        for row in rows:
+            by_channel[int(row[1])].append(row)
+
+        channel_ids = list(by_channel)
+        results = await asyncio.gather(*(self.send_to_channel(channel_id, by_channel[channel_id]) for channel_id in channel_ids))
+
+        sent: list[int] = []
+        retries: list[tuple[int, float]] = []
+        now = time()
+        for channel_id, delivered in zip(channel_ids, results):
+            for outbox_id, _, _, attempts, *_ in by_channel[channel_id]:
+                if delivered:
+                    sent.append(outbox_id)
+                else:
+                    retries.append((outbox_id, now + min(OUTBOX_RETRY_BASE * 2**attempts, OUTBOX_RETRY_MAX)))
+
+        async with self.bot.database.writer() as conn:
+            if sent:
+                await db.delete_outbox_rows(conn, sent)
+            if retries:
+                await db.retry_outbox_rows(conn, retries)
+        if retries:
+            ic(f"{len(retries)} notification(s) will be retried.")
+        return len(rows)
+
+    async def flush_channel_health(self) -> None:
+        dead, self.resolver.newly_dead = self.resolver.newly_dead, set()
+        alive, self.resolver.newly_alive = self.resolver.newly_alive, set()
+        prune = monotonic() - self.last_prune >= PRUNE_INTERVAL
+        if not (dead or alive or prune):
+            return
+
+        try:
+            async with self.bot.database.writer() as conn:
+                if dead:
+                    await db.set_channels_dead(conn, dead, int(time()))
+                if alive:
+                    await db.set_channels_dead(conn, alive, None)
+                if prune:
+                    pruned = await db.prune_dead_user_interests(conn, int(time() - DEAD_INTEREST_RETENTION))
+                    self.last_prune = monotonic()
+                    if pruned:
+                        self.bot.course_cache.clear()
+                        ic(f"Pruned {pruned} user interests in dead channels.")
+        except Exception as e:
+            ic(f"Error while trying to record channel health: {e}")
+
+    async def send_to_channel(self, channel_id: int, rows: list[Row]) -> bool:
+        # True once the channel's alerts are delivered, or can never be because the channel is gone; False to retry.
+        # Messages to one channel share a rate limit bucket, so they go out in order; channels run in parallel.
+        # discord.py waits out 429s per bucket on its own, the semaphore just caps how many buckets we hit at once.
+        ansi_messages = [
+            (format_status_message(course_name, course_number, status), user_ids.split(","))
+            for _, _, status, _, course_name, course_number, user_ids in rows if user_ids
+        ]
+        if not ansi_messages:
+            return True
+        messages = build_messages(ansi_messages)
+
+        async with self.semaphore:
+            channel = await self.resolver.resolve(channel_id)
+            if channel is None:
+                return channel_id in self.resolver.dead
+
+            try:
+                with self.bot.metrics.notification_seconds.time():
+                    for message in messages:
+                        await channel.send(message)
+                ic(f"Sent {len(messages)} notification message(s) to channel {channel_id}.")
+                return True
+            except (discord.NotFound, discord.Forbidden) as e:
+                self.bot.metrics.notification_failures.inc()
+                self.resolver.mark_dead(channel_id)
+                ic(f"Channel {channel_id} is no longer reachable: {e}")
+                return True
+            except Exception as e:
+                self.bot.metrics.notification_failures.inc()
+                ic(f"Error while trying to notify channel {channel_id}: {e}")
+                return False
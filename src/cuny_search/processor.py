@@ -1,31 +1,59 @@
+import asyncio
+import multiprocessing
 import re
-from typing import Any
-from bs4 import BeautifulSoup, Tag, NavigableString
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, TypeVar
+from urllib.parse import parse_qs, urlparse
+from icecream import ic
+from lxml import etree
+from cuny_search.constants import PAGE_PARSER, PARSE_EXECUTOR, PARSE_EXECUTOR_WORKERS
 from cuny_search.models import CourseDetails, CourseAvailabilities
+from cuny_search.utils import decode_b64
 
+# bs4 is only needed by the "soup" parser, so the default fast path never imports it
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, NavigableString, Tag
 
-def safe_find(soup: BeautifulSoup, tag: str, *args: Any, **kwargs: Any) -> Tag | NavigableString:
+T = TypeVar("T")
+
+_executor: Executor | None = None
+# Pages are handed to lxml as UTF-8 bytes; a str with an XML encoding declaration is rejected by fromstring
+_html_parser = etree.HTMLParser(recover=True, encoding="utf-8")
+
+STATUS_PATTERN = re.compile("Open|Closed|Wait")
+CLASS_NUMBER_PATTERN = re.compile("Class Number")
+CLASS_AVAILABILITY_PATTERN = re.compile("Class Availability")
+SHADOWBOX_XPATH = etree.XPath("(//div[contains(concat(' ', normalize-space(@class), ' '), ' shadowbox ')])[1]")
+NEXT_ELEMENT_XPATH = etree.XPath("(descendant::* | following::*)[1]")
+NEXT_TABLE_XPATH = etree.XPath("(descendant::table | following::table)[1]")
+DATA_LABEL_XPATH = etree.XPath("(//td[@data-label = $label])[1]")
+CLASS_LINK_XPATH = etree.XPath("//a[contains(@href, 'class_number_searched')]")
+
+
+def safe_find(soup: "BeautifulSoup", tag: str, *args: Any, **kwargs: Any) -> "Tag | NavigableString":
     result = soup.find(tag, *args, **kwargs)
     if not result:
         raise ValueError(f"Could not find tag: {tag} with {kwargs}")
     return result
 
 
-def safe_find_next(el: Tag, *args: Any, **kwargs: Any) -> Tag | NavigableString:
+def safe_find_next(el: "Tag", *args: Any, **kwargs: Any) -> "Tag | NavigableString":
     result = el.find_next(*args, **kwargs)
     if not result:
         raise ValueError(f"Could not find next tag from element: {el} with {kwargs}")
     return result
 
 
-def get_data_label(soup: BeautifulSoup, label: str) -> str:
+def get_data_label(soup: "BeautifulSoup", label: str) -> str:
     td = soup.find("td", attrs={"data-label": label})
     if not td:
         raise ValueError(f"Could not find <td> with data-label '{label}'")
     return td.get_text(strip=True)
 
 
-def process(soup: BeautifulSoup) -> tuple[CourseDetails, CourseAvailabilities]:
+def process(soup: "BeautifulSoup") -> tuple[CourseDetails, CourseAvailabilities]:
     div = safe_find(soup, "div", attrs={"class": "shadowbox"})
     p = div.find("p")
     if not p:
@@ -62,7 +90,7 @@ def process(soup: BeautifulSoup) -> tuple[CourseDetails, CourseAvailabilities]:
     spans = availability_table.find_all("span")
     if len(spans) < 5:
         raise ValueError(f"Expected 5 spans in availability table but found {len(spans)}")
-    span_values = [span.get_text(strip=True) for span in spans[:5]]
+    span_values = [int(span.get_text(strip=True)) for span in spans[:5]]
 
     course_details = CourseDetails(
         course_number=course_number,
@@ -85,5 +113,206 @@ def process(soup: BeautifulSoup) -> tuple[CourseDetails, CourseAvailabilities]:
     return (course_details, course_availabilities)
 
 
+def get_element_text(el: etree._Element) -> str:
+    # Mirrors Tag.get_text(strip=True): comments, scripts and styles contribute no text
+    parts: list[str] = []
+
+    def collect(node: etree._Element) -> None:
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            if isinstance(child.tag, str) and child.tag not in ("script", "style", "template"):
+                collect(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    collect(el)
+    return "".join(stripped for part in parts if (stripped := part.strip()))
+
+
+def get_single_string(el: etree._Element) -> str | None:
+    # Mirrors Tag.string: the only child node if it is a string, recursing through single-child tags
+    contents: list[str | etree._Element] = [el.text] if el.text else []
+    for child in el:
+        contents.append(child.text or "" if not isinstance(child.tag, str) else child)
+        if child.tail:
+            contents.append(child.tail)
+
+    if len(contents) != 1:
+        return None
+    child = contents[0]
+    return child if isinstance(child, str) else get_single_string(child)
+
+
+def find_by_string(root: etree._Element, tag: str, pattern: re.Pattern) -> etree._Element | None:
+    for el in root.iter(tag):
+        string = get_single_string(el)
+        if string is not None and pattern.search(string):
+            return el
+    return None
+
+
+def first(results: list) -> Any:
+    return results[0] if results else None
+
+
+def process_fast(html: str) -> tuple[CourseDetails, CourseAvailabilities]:
+    # Same fields and error messages as process, read straight off lxml's C tree instead of a BeautifulSoup DOM
+    root = etree.fromstring(html.encode(), _html_parser) if html.strip() else None
+    if root is None:
+        raise ValueError("Could not find tag: div with {'attrs': {'class': 'shadowbox'}}")
+
+    div = first(SHADOWBOX_XPATH(root))
+    if div is None:
+        raise ValueError("Could not find tag: div with {'attrs': {'class': 'shadowbox'}}")
+    p = next(div.iter("p"), None)
+    if p is None:
+        raise ValueError("Could not find <p> tag in shadowbox")
+
+    details = get_element_text(p)
+    course_name = details.split(" - ")[0]
+
+    td = find_by_string(root, "td", CLASS_NUMBER_PATTERN)
+    if td is None:
+        raise ValueError(f"Could not find tag: td with {{'string': {CLASS_NUMBER_PATTERN!r}}}")
+    next_el = first(NEXT_ELEMENT_XPATH(td))
+    if next_el is None:
+        raise ValueError(f"Could not find next tag from element: {etree.tostring(td, encoding=str, with_tail=False)} with {{}}")
+    course_number = get_element_text(next_el)
+
+    img = next((img for img in root.iter("img") if STATUS_PATTERN.search(img.get("title", ""))), None)
+    if img is None:
+        raise ValueError("Could not find <img> with status title")
+
+    status_td = next(img.iterancestors("td"), None)
+    if status_td is None:
+        raise ValueError("Could not find parent <td> of status <img>")
+    status = get_element_text(status_td)
+
+    data_labels: dict[str, str] = {}
+    for label in ("Days And Times", "Room", "Instructor", "Meeting Dates"):
+        label_td = first(DATA_LABEL_XPATH(root, label=label))
+        if label_td is None:
+            raise ValueError(f"Could not find <td> with data-label '{label}'")
+        data_labels[label] = get_element_text(label_td)
+
+    availability_header = find_by_string(root, "b", CLASS_AVAILABILITY_PATTERN)
+    if availability_header is None:
+        raise ValueError("Could not find bolded 'Class Availability' header")
+
+    availability_table = first(NEXT_TABLE_XPATH(availability_header))
+    if availability_table is None:
+        raise ValueError("Could not find availability table after 'Class Availability' header")
+
+    spans = list(availability_table.iter("span"))
+    if len(spans) < 5:
+        raise ValueError(f"Expected 5 spans in availability table but found {len(spans)}")
+    span_values = [int(get_element_text(span)) for span in spans[:5]]
+
+    course_details = CourseDetails(
+        course_number=course_number,
+        course_name=course_name,
+        days_and_times=data_labels["Days And Times"],
+        room=data_labels["Room"],
+        instructor=data_labels["Instructor"],
+        meeting_dates=data_labels["Meeting Dates"]
+    )
+
+    course_availabilities = CourseAvailabilities(
+        status=status,
+        course_capacity=span_values[0],
+        waitlist_capacity=span_values[1],
+        currently_enrolled=span_values[2],
+        currently_waitlisted=span_values[3],
+        available_seats=span_values[4]
+    )
+
+    return (course_details, course_availabilities)
+
+
+def process_listing(html: str) -> dict[str, str]:
+    # Maps class number to status for every section on a subject search results page
+    root = etree.fromstring(html.encode(), _html_parser) if html.strip() else None
+    if root is None:
+        return {}
+
+    statuses: dict[str, str] = {}
+    for link in CLASS_LINK_XPATH(root):
+        query = parse_qs(urlparse(link.get("href", "")).query)
+        try:
+            class_number = decode_b64(query["class_number_searched"][0])
+        except (KeyError, ValueError):
+            class_number = get_element_text(link)
+
+        row = next(link.iterancestors("tr"), None)
+        if row is None:
+            continue
+        img = next((img for img in row.iter("img") if STATUS_PATTERN.search(img.get("title", ""))), None)
+        if img is not None:
+            statuses[class_number] = img.get("title").strip()
+    return statuses
+
+
+def process_page(html: str) -> tuple[CourseDetails, CourseAvailabilities]:
+    if PAGE_PARSER == "fast":
+        return process_fast(html)
+
+    from bs4 import BeautifulSoup
+    return process(BeautifulSoup(html, "lxml"))
+
+
+def get_executor() -> Executor | None:
+    global _executor
+    if _executor is None:
+        if PARSE_EXECUTOR == "process":
+            # Forking a process that already runs aiosqlite, gateway and httpx threads can copy a held lock into the
+            # child, and copies the whole bot besides. Forkserver children start clean and only import the parser.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload(["cuny_search.processor"])
+            _executor = ProcessPoolExecutor(max_workers=PARSE_EXECUTOR_WORKERS, mp_context=context)
+        elif PARSE_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(max_workers=PARSE_EXECUTOR_WORKERS, thread_name_prefix="parser")
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_parser(parser: Callable[[str], T], html: str) -> T:
+    # Only the raw page goes to the pool and only the small parsed results come back
+    executor = get_executor()
+    if executor is None:
+        return parser(html)
+
+    # Only a pool that is shut down or broken falls back; errors raised by the parser itself propagate
+    try:
+        future = asyncio.get_running_loop().run_in_executor(executor, parser, html)
+    except (BrokenProcessPool, RuntimeError) as e:
+        ic(f"Parser pool unavailable, falling back to inline parsing: {e}")
+        shutdown_executor()
+        return parser(html)
+
+    try:
+        return await future
+    except BrokenProcessPool as e:
+        ic(f"Parser pool broke, falling back to inline parsing: {e}")
+        shutdown_executor()
+        return parser(html)
+
+
+async def process_page_async(html: str) -> tuple[CourseDetails, CourseAvailabilities]:
+    return await run_parser(process_page, html)
+
+
+async def process_listing_async(html: str) -> dict[str, str]:
+    return await run_parser(process_listing, html)
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,106 @@
+import heapq
+from collections.abc import Iterable
+from dataclasses import dataclass
+from math import log2
+from random import uniform
+from time import monotonic
+from cuny_search.constants import POLL_MAX_INTERVAL, POLL_MIN_INTERVAL
+
+
+@dataclass
+class PollStats:
+    next_due: float | None
+    interval: float
+    last_changed: float | None = None
+    volatility: float = 0.0
+    available_seats: int | None = None
+    watchers: int = 1
+
+
+class PollScheduler:
+    def __init__(self, min_interval: float = POLL_MIN_INTERVAL, max_interval: float = POLL_MAX_INTERVAL) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stats: dict[int, PollStats] = {}
+        self.heap: list[tuple[float, int]] = []
+
+    def sync(self, rows: Iterable[tuple[int, int, int | None]]) -> None:
+        # rows are (uid, watchers, available_seats) for every tracked course
+        now = monotonic()
+        seen: set[int] = set()
+        for uid, watchers, available_seats in rows:
+            seen.add(uid)
+            stats = self.stats.get(uid)
+            if stats is None:
+                stats = self.stats[uid] = PollStats(next_due=now, interval=self.min_interval)
+                heapq.heappush(self.heap, (now, uid))
+            stats.watchers = watchers
+            stats.available_seats = available_seats
+
+        # Removed courses are dropped here; their heap entries are skipped lazily in pop_due
+        for uid in self.stats.keys() - seen:
+            del self.stats[uid]
+
+    def compute_interval(self, stats: PollStats, now: float) -> float:
+        # Recent churn, few remaining seats and many watchers all pull the next poll closer
+        volatility_factor = 1 - 0.8*stats.volatility
+
+        if stats.available_seats is None:
+            seats_factor = 1.0
+        else:
+            seats_factor = 0.25 + 0.75*min(max(stats.available_seats, 0), 40)/40
+
+        watchers_factor = 1 / (1 + log2(max(stats.watchers, 1)))
+
+        if stats.last_changed is None:
+            staleness_factor = 1.0
+        else:
+            staleness_factor = 0.5 + 0.5*min((now - stats.last_changed)/3600, 1)
+
+        interval = self.max_interval * volatility_factor * seats_factor * watchers_factor * staleness_factor
+        return min(max(interval * uniform(0.9, 1.1), self.min_interval), self.max_interval)
+
+    def _schedule(self, uid: int, stats: PollStats, now: float) -> None:
+        stats.interval = self.compute_interval(stats, now)
+        stats.next_due = now + stats.interval
+        heapq.heappush(self.heap, (stats.next_due, uid))
+
+    def pop_due(self) -> list[int]:
+        now = monotonic()
+        due: list[int] = []
+        while self.heap and self.heap[0][0] <= now:
+            next_due, uid = heapq.heappop(self.heap)
+            stats = self.stats.get(uid)
+            if stats is None or stats.next_due != next_due:
+                continue
+            stats.next_due = None
+            due.append(uid)
+        return due
+
+    def record(self, uid: int, changed: bool) -> None:
+        stats = self.stats.get(uid)
+        if stats is None:
+            return
+
+        now = monotonic()
+        stats.volatility = 0.7*stats.volatility + (0.3 if changed else 0.0)
+        if changed:
+            stats.last_changed = now
+        self._schedule(uid, stats, now)
+
+    def release(self, uids: Iterable[int]) -> None:
+        # Courses that were due but never observed (failed scrapes or parses) keep their cadence
+        now = monotonic()
+        for uid in uids:
+            stats = self.stats.get(uid)
+            if stats is not None and stats.next_due is None:
+                self._schedule(uid, stats, now)
+
+    def seconds_until_next(self) -> float:
+        while self.heap:
+            next_due, uid = self.heap[0]
+            stats = self.stats.get(uid)
+            if stats is not None and stats.next_due == next_due:
+                return max(next_due - monotonic(), 0.0)
+            heapq.heappop(self.heap)
+        return self.max_interval
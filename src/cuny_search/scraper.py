@@ -1,50 +1,427 @@
 import asyncio
-from bs4 import BeautifulSoup
-from dataclasses import asdict
-from httpx import AsyncClient
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, nullcontext
+from time import monotonic
+from typing import TYPE_CHECKING
+from dataclasses import asdict, astuple
+from httpx import AsyncClient, Limits
 from icecream import ic
-from cuny_search.constants import COLLEGE_CODES, DEFAULT_INSTITUTION, HEADERS
+from cuny_search.constants import (
+    BREAKER_COOLDOWN,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MAX_COOLDOWN,
+    CLASS_PAGE_MARKER,
+    COLLEGE_CODES,
+    DEFAULT_INSTITUTION,
+    GLOBAL_SEARCH_URL,
+    GOVERNOR_BURST,
+    GOVERNOR_INITIAL_CONCURRENCY,
+    GOVERNOR_LATENCY_TARGET,
+    GOVERNOR_MAX_CONCURRENCY,
+    GOVERNOR_RATE,
+    HEADERS,
+    LISTING_SEARCH_FORM,
+    SCRAPE_WORKERS,
+    SESSION_CLOSE_GRACE,
+    SESSION_EXPIRY_GRACE,
+    SESSION_MAX_AGE,
+    SESSION_RENEW_INTERVAL,
+    SESSION_RENEW_MARGIN
+)
+from cuny_search.metrics import Metrics
 from cuny_search.models import CourseParams, EncodedParams
-from cuny_search.utils import get_current_term_and_year, get_global_search_term_value
+from cuny_search.singleflight import SingleFlight
+from cuny_search.utils import decode_b64, get_current_term_and_year, get_global_search_term_value, get_year_and_term
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
-async def refresh_client():
+
+async def prime_client(institution: str = DEFAULT_INSTITUTION, term_code: str | None = None) -> AsyncClient:
+    if term_code is None:
+        year, term = get_current_term_and_year()
+        term_code = str(get_global_search_term_value(year, term))
+    else:
+        year, term = get_year_and_term(int(term_code))
+
+    payload: dict[str, str] = {
+        "selectedInstName": f"{institution} |",
+        "inst_selection": COLLEGE_CODES[institution],
+        "selectedTermName": f"{year} {term}",
+        "term_value": term_code,
+        "next_btn": "Next",
+    }
+    client = AsyncClient(headers=HEADERS, limits=Limits(max_keepalive_connections=SCRAPE_WORKERS))
+    try:
+        response = await client.post(GLOBAL_SEARCH_URL, data=payload)
+        response.raise_for_status()
+    except BaseException:
+        await client.aclose()
+        raise
+    ic(f"Scraper client successfully refreshed for {institution} {year} {term}.")
+    return client
+
+
+async def refresh_client(institution: str = DEFAULT_INSTITUTION, term_code: str | None = None) -> AsyncClient:
     while True:
         try:
-            year, term = get_current_term_and_year()
-            term_code = get_global_search_term_value(year, term)
-
-            payload: dict[str, str] = {
-                "selectedInstName": f"{DEFAULT_INSTITUTION} |",
-                "inst_selection": COLLEGE_CODES[DEFAULT_INSTITUTION],
-                "selectedTermName": f"{year} {term}",
-                "term_value": str(term_code),
-                "next_btn": "Next",
-            }
-            client = AsyncClient(headers=HEADERS)
-
-            await client.post("https://globalsearch.cuny.edu/CFGlobalSearchTool/CFSearchToolController", data=payload)
-            ic("Scraper client successfully refreshed.")
-            return client
+            return await prime_client(institution, term_code)
         except Exception as e:
             ic(f"Error while trying to create scraper session: {e}")
             await asyncio.sleep(2)
 
 
-async def scrape(client: AsyncClient, params: CourseParams | EncodedParams) -> BeautifulSoup | None:
+def get_session_key(params: CourseParams | EncodedParams) -> tuple[str, str]:
+    if isinstance(params, EncodedParams):
+        return (decode_b64(params.inst_searched), decode_b64(params.term_searched))
+    return (params.institution, params.term_code)
+
+
+def get_params_key(params: CourseParams | EncodedParams) -> tuple[str, str, str, str]:
+    if isinstance(params, EncodedParams):
+        return astuple(params)
+    return params.get_encoded_tuple()
+
+
+def is_class_page(html: str) -> bool:
+    return CLASS_PAGE_MARKER in html
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        threshold: int = BREAKER_FAILURE_THRESHOLD,
+        cooldown: float = BREAKER_COOLDOWN,
+        max_cooldown: float = BREAKER_MAX_COOLDOWN
+    ) -> None:
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probe: asyncio.Event | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def seconds_until_probe(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.cooldown - monotonic(), 0.0)
+
+    async def allow(self) -> bool:
+        # Once the cooldown is over a single request probes the site; the rest wait to hear how it went
+        while True:
+            state = self.state
+            if state != "half-open":
+                return state == "closed"
+            if self.probe is None:
+                self.probe = asyncio.Event()
+                return True
+            await self.probe.wait()
+
+    def _end_probe(self) -> None:
+        if self.probe is not None:
+            self.probe.set()
+            self.probe = None
+
+    def cancel_probe(self) -> None:
+        if self.state == "half-open":
+            self._end_probe()
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            if self.opened_at is not None:
+                ic("Global Search is answering again, closing the circuit breaker.")
+            self.failures = 0
+            self.opened_at = None
+            self.cooldown = self.base_cooldown
+            self._end_probe()
+            return
+
+        self.failures += 1
+        if self.probe is not None:
+            self.cooldown = min(self.max_cooldown, self.cooldown*2)
+            self.opened_at = monotonic()
+            self._end_probe()
+            ic(f"Global Search probe failed, leaving it alone for {self.cooldown:.0f}s.")
+        elif self.opened_at is None and self.failures >= self.threshold:
+            self.opened_at = monotonic()
+            ic(f"{self.failures} Global Search requests failed in a row, leaving it alone for {self.cooldown:.0f}s.")
+
+
+class SessionPool:
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+        self.sessions: dict[tuple[str, str], tuple[AsyncClient, float]] = {}
+        self.last_used: dict[tuple[str, str], float] = {}
+        # Concurrent primes and refreshes of one session share a single POST to the controller
+        self.flights = SingleFlight(ttl=0)
+        self.breaker = CircuitBreaker()
+        # Classes that came back without class data even on a fresh session, with when that was last seen
+        self.missing: dict[tuple[str, str, str, str], float] = {}
+        self.retiring: set[asyncio.Task] = set()
+        self.task: asyncio.Task | None = None
+
+    def is_healthy(self, key: tuple[str, str]) -> bool:
+        entry = self.sessions.get(key)
+        if entry is None:
+            return False
+        session, created_at = entry
+        return not session.is_closed and monotonic() - created_at < SESSION_MAX_AGE
+
+    async def get(self, params: CourseParams | EncodedParams) -> AsyncClient:
+        key = get_session_key(params)
+        self.last_used[key] = monotonic()
+        if not self.is_healthy(key):
+            reason = "expired" if key in self.sessions else "new"
+            await self.flights.do(key, lambda: self._replace(key, reason))
+        return self.sessions[key][0]
+
+    async def refresh(self, params: CourseParams | EncodedParams, stale: AsyncClient) -> AsyncClient:
+        key = get_session_key(params)
+        entry = self.sessions.get(key)
+        # Whoever noticed first already replaced it, so later callers just pick up the new session
+        if entry is not None and entry[0] is not stale and not entry[0].is_closed:
+            return entry[0]
+        await self.flights.do(key, lambda: self._replace(key, "error_page"))
+        return self.sessions[key][0]
+
+    async def _replace(self, key: tuple[str, str], reason: str) -> None:
+        institution, term_code = key
+        session = await prime_client(institution, term_code)
+        entry = self.sessions.get(key)
+        self.sessions[key] = (session, monotonic())
+        if entry is not None:
+            self.retire(entry[0])
+        self.metrics.session_refreshes.inc(reason=reason)
+
+    def retire(self, session: AsyncClient) -> None:
+        task = asyncio.create_task(self._close_later(session))
+        self.retiring.add(task)
+        task.add_done_callback(self.retiring.discard)
+
+    async def _close_later(self, session: AsyncClient) -> None:
+        # Requests still in flight on the old session get to finish before it is closed
+        try:
+            await asyncio.sleep(SESSION_CLOSE_GRACE)
+        finally:
+            await session.aclose()
+
+    async def fetch(self, params: CourseParams | EncodedParams, governor: "RequestGovernor | None" = None) -> str | None:
+        if not await self.breaker.allow():
+            return None
+        try:
+            html = await self._fetch(params, governor)
+        except asyncio.CancelledError:
+            self.breaker.cancel_probe()
+            raise
+        self.breaker.record(html is not None)
+        self.metrics.circuit_open.set(0 if self.breaker.opened_at is None else 1)
+        return html
+
+    async def _fetch(self, params: CourseParams | EncodedParams, governor: "RequestGovernor | None") -> str | None:
+        key = get_session_key(params)
+        try:
+            session = await self.get(params)
+        except Exception as e:
+            ic(f"Error while trying to prime a scraper session for {key}: {e}")
+            return None
+
+        params_key = get_params_key(params)
+        html = await fetch_page(session, params, governor)
+        if html is None:
+            return None
+        if is_class_page(html):
+            self.missing.pop(params_key, None)
+            return html
+
+        # Global Search answers both an expired session and a class that does not exist with a 200 search page.
+        # Only a class that has not already failed on a fresh session is worth refreshing the shared session for.
+        entry = self.sessions.get(key)
+        fresh = entry is not None and entry[0] is session and monotonic() - entry[1] < SESSION_EXPIRY_GRACE
+        if fresh or params_key in self.missing:
+            self.missing[params_key] = monotonic()
+            return html
+
+        try:
+            session = await self.refresh(params, stale=session)
+        except Exception as e:
+            ic(f"Error while trying to refresh the scraper session for {key}: {e}")
+            return None
+        html = await fetch_page(session, params, governor)
+        if html is not None and not is_class_page(html):
+            self.missing[params_key] = monotonic()
+        return html
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(SESSION_RENEW_INTERVAL)
+            try:
+                await self.renew()
+            except Exception as e:
+                ic(f"Error while trying to renew scraper sessions: {e}")
+
+    async def renew(self) -> None:
+        now = monotonic()
+        self.missing = {params_key: seen for params_key, seen in self.missing.items() if now - seen < SESSION_MAX_AGE}
+        for key, (session, created_at) in list(self.sessions.items()):
+            if now - self.last_used.get(key, 0) >= SESSION_MAX_AGE:
+                # Nobody has asked for this institution and term in a while, so it is dropped instead of kept alive
+                del self.sessions[key]
+                self.last_used.pop(key, None)
+                self.retire(session)
+                continue
+            if now - created_at < SESSION_MAX_AGE - SESSION_RENEW_MARGIN or self.breaker.state != "closed":
+                continue
+            try:
+                await self.flights.do(key, lambda key=key: self._replace(key, "renewal"))
+            except Exception as e:
+                self.breaker.record(False)
+                ic(f"Error while trying to renew the scraper session for {key}: {e}")
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        for task in list(self.retiring):
+            task.cancel()
+        await asyncio.gather(*self.retiring, return_exceptions=True)
+        for session, _ in self.sessions.values():
+            if not session.is_closed:
+                await session.aclose()
+        self.sessions.clear()
+        self.last_used.clear()
+
+
+class RequestGovernor:
+    def __init__(
+        self,
+        rate: float = GOVERNOR_RATE,
+        burst: float = GOVERNOR_BURST,
+        initial_limit: float = GOVERNOR_INITIAL_CONCURRENCY,
+        max_limit: float = GOVERNOR_MAX_CONCURRENCY,
+        latency_target: float = GOVERNOR_LATENCY_TARGET
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = monotonic()
+        self.limit = initial_limit
+        self.min_limit = 1.0
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.last_decrease = 0.0
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def _take_token(self) -> None:
+        while True:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill)*self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens)/self.rate)
+
+    def _adjust(self, latency: float, ok: bool) -> None:
+        # AIMD: grow by roughly one slot per window of healthy requests, halve at most once per window on trouble
+        if ok and latency <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + 1/self.limit)
+            return
+
+        now = monotonic()
+        if now - self.last_decrease >= self.latency_target:
+            self.limit = max(self.min_limit, self.limit/2)
+            self.last_decrease = now
+            ic(f"Backing off Global Search requests to {self.limit:.1f} concurrent (latency={latency:.2f}s, ok={ok})")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        start = monotonic()
+        ok = False
+        cancelled = False
+        try:
+            await self._take_token()
+            start = monotonic()
+            yield
+            ok = True
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                self._adjust(monotonic() - start, ok)
+            self.in_flight -= 1
+            async with self.condition:
+                self.condition.notify_all()
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "rate_per_second": self.rate,
+            "tokens": round(self.tokens, 2),
+        }
+
+
+async def fetch_page(client: AsyncClient, params: CourseParams | EncodedParams, governor: RequestGovernor | None = None) -> str | None:
     if isinstance(params, EncodedParams):
         params = asdict(params)
     else:
         params = params.get_encoded_params()
 
     try:
-        response = await client.get("https://globalsearch.cuny.edu/CFGlobalSearchTool/CFSearchToolController", params=params)
-        soup = BeautifulSoup(response.text, "lxml")
-        return soup
+        async with governor.slot() if governor else nullcontext():
+            response = await client.get(GLOBAL_SEARCH_URL, params=params)
+            response.raise_for_status()
+        return response.text
     except Exception as e:
         ic(f"Error while trying to scrape all courses for availability: {e}")
         return None
 
 
+async def fetch_listing(client: AsyncClient, subject: str, governor: RequestGovernor | None = None) -> str | None:
+    # The session is already primed for an institution and term, so the search only needs the subject
+    payload = {**LISTING_SEARCH_FORM, "subject_name": subject, "selectedSubjectName": subject}
+    try:
+        async with governor.slot() if governor else nullcontext():
+            response = await client.post(GLOBAL_SEARCH_URL, data=payload)
+            response.raise_for_status()
+        return response.text
+    except Exception as e:
+        ic(f"Error while trying to fetch the {subject} listing: {e}")
+        return None
+
+
+async def scrape(client: AsyncClient, params: CourseParams | EncodedParams) -> "BeautifulSoup | None":
+    html = await fetch_page(client, params)
+    if html is None:
+        return None
+
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "lxml")
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,41 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from time import monotonic
+from typing import Any, TypeVar
+from cuny_search.constants import SINGLE_FLIGHT_TTL
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = SINGLE_FLIGHT_TTL) -> None:
+        self.ttl = ttl
+        self.in_flight: dict[Hashable, asyncio.Task] = {}
+        self.results: dict[Hashable, tuple[float, Any]] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        cached = self.results.get(key)
+        if cached and monotonic() - cached[0] < self.ttl:
+            self.shared += 1
+            return cached[1]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+
+        # Shielded so one caller giving up does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        self.in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or task.result() is None:
+            return
+
+        now = monotonic()
+        self.results = {k: v for k, v in self.results.items() if now - v[0] < self.ttl}
+        self.results[key] = (now, task.result())
@@ -0,0 +1,69 @@
+import asyncio
+from collections.abc import Callable, Coroutine
+from time import monotonic
+from typing import Any
+import discord
+from icecream import ic
+from cuny_search.constants import MONITOR_HEALTHY_AFTER, MONITOR_RESTART_BASE, MONITOR_RESTART_MAX
+
+MONITOR_TASK_NAME = "monitor"
+
+
+class MonitorSupervisor:
+    def __init__(self, bot: discord.Client, monitor: Callable[[], Coroutine[Any, Any, Any]]) -> None:
+        self.bot = bot
+        self.monitor = monitor
+        self.task: asyncio.Task | None = None
+        self.restarts = 0
+
+    @property
+    def live_tasks(self) -> int:
+        # Counted from the event loop rather than trusted from self.task, so a leaked loop would show up here
+        return sum(1 for task in asyncio.all_tasks() if task.get_name() == MONITOR_TASK_NAME and not task.done())
+
+    def start(self) -> None:
+        # Safe to call any number of times; there is only ever one supervised loop
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(), name="monitor-supervisor")
+
+    async def run(self) -> None:
+        delay = MONITOR_RESTART_BASE
+        while True:
+            started = monotonic()
+            monitor = asyncio.create_task(self.monitor(), name=MONITOR_TASK_NAME)
+            self.bot.metrics.monitor_tasks.set(self.live_tasks)
+            try:
+                await monitor
+                ic("Monitor loop returned unexpectedly, restarting it.")
+            except asyncio.CancelledError:
+                monitor.cancel()
+                await asyncio.gather(monitor, return_exceptions=True)
+                raise
+            except Exception as e:
+                ic(f"Monitor loop crashed: {e!r}")
+            finally:
+                self.bot.metrics.monitor_tasks.set(self.live_tasks)
+
+            if monotonic() - started >= MONITOR_HEALTHY_AFTER:
+                delay = MONITOR_RESTART_BASE
+            self.restarts += 1
+            self.bot.metrics.monitor_restarts.inc()
+            ic(f"Restarting the monitor loop in {delay:.0f}s (restart #{self.restarts}).")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MONITOR_RESTART_MAX)
+
+    async def stop(self) -> None:
+        # Cancelling the supervisor cancels the monitor with it and waits for its sweep to unwind
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        self.bot.metrics.monitor_tasks.set(self.live_tasks)
+
+    async def wait(self) -> None:
+        if self.task is not None:
+            await self.task
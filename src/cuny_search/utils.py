@@ -1,11 +1,19 @@
-from base64 import b64encode
+import os
+import socket
+from base64 import b64decode, b64encode
 from datetime import datetime
+from uuid import uuid4
+from cuny_search.constants import HISTORY_STATUS_CODES
 
 
 def encode_b64(s: str) -> str:
     return b64encode(s.encode()).decode()
 
 
+def decode_b64(s: str) -> str:
+    return b64decode(s).decode()
+
+
 def get_current_term_and_year() -> tuple[int, str]:
     now = datetime.now()
 
@@ -23,6 +31,30 @@ def get_global_search_term_value(year: int, term: str) -> int:
     return (year-1900)*10 + term_offsets[term]
 
 
+def get_year_and_term(term_value: int) -> tuple[int, str]:
+    term_names = { 2: "Spring Term", 6: "Summer Term", 9: "Fall Term" }
+    return (term_value//10 + 1900, term_names[term_value%10])
+
+
 def get_schedule_builder_term_value(year: int, term: str) -> str:
     term_map = { "Spring Term": 10, "Summer Term": 20, "Fall Term": 30 }
-    return f"320{year%100}{term_map[term]}"
\ No newline at end of file
+    return f"320{year%100}{term_map[term]}"
+
+
+def status_changed(prev_status: str, new_status: str) -> bool:
+    if prev_status == new_status:
+        return False
+    return "Open" in (prev_status, new_status)
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def get_status_code(status: str) -> int:
+    return HISTORY_STATUS_CODES.get(status, -1)
+
+
+def get_status_name(status_code: int) -> str:
+    status_names = { code: status for status, code in HISTORY_STATUS_CODES.items() }
+    return status_names.get(status_code, "Unknown")
\ No newline at end of file
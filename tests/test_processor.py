@@ -0,0 +1,157 @@
+import json
+import re
+from base64 import b64encode
+from dataclasses import asdict
+from pathlib import Path
+import pytest
+from bs4 import BeautifulSoup
+from cuny_search.processor import process, process_fast, process_listing
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent/"benchmarks"/"pages"
+CORPUS = sorted(path.name for path in CORPUS_DIR.glob("*.html"))
+
+PAGE = """<html><head><title>CUNY Global Class Search - Class Detail</title>
+<script type="text/javascript">function goBack() {{ document.forms["searchform"].submit(); }}</script>
+</head><body>
+<div class="container shadowbox">
+  <p><span>CSCI 313 - 01-LEC Regular </span>- Data Structures</p>
+  <p class="institution">Queens College | 2025 Fall Term</p>
+</div>
+<div class="container shadowbox">
+<table class="classDetails">
+<tr><td>Class Number</td><td>45123</td></tr>
+<tr><td>Status</td><td><img src="images/{icon}.gif" title="{status}" alt="{status}" /> {status}</td></tr>
+</table>
+</div>
+<div class="container shadowbox">
+<table class="table table-bordered classMeeting">
+<thead><tr><th>Days And Times</th><th>Room</th><th>Instructor</th><th>Meeting Dates</th></tr></thead>
+<tbody>
+<tr><td data-label="Days And Times">MoWe 10:45AM - 12:00PM</td><td data-label="Room">Science Bldg C205</td>
+<td data-label="Instructor">{instructor}</td><td data-label="Meeting Dates">08/25/2025 - 12/22/2025</td></tr>
+</tbody></table>
+</div>
+<div class="container shadowbox">
+<b>Class Availability</b>
+<table>
+<tr><td>Class Capacity</td><td><span>30</span></td></tr>
+<tr><td>Wait List Capacity</td><td><span>10</span></td></tr>
+<tr><td>Enrollment Total</td><td><span>{enrolled}</span></td></tr>
+<tr><td>Wait List Total</td><td><span>{waitlisted}</span></td></tr>
+<tr><td>Available Seats</td><td><span>{available}</span></td></tr>
+</table>
+</div>
+<form name="searchform" method="post" action="CFSearchToolController"></form>
+</body></html>"""
+
+PAGES = {
+    "open": dict(icon="open", status="Open", instructor="Jane Doe", enrolled=24, waitlisted=0, available=6),
+    "closed": dict(icon="closed", status="Closed", instructor="Jane Doe", enrolled=30, waitlisted=0, available=0),
+    "waitlist": dict(icon="wait", status="Wait List", instructor="Jane Doe", enrolled=30, waitlisted=4, available=0),
+    "missing_instructor": dict(icon="open", status="Open", instructor="", enrolled=10, waitlisted=0, available=20),
+    "non_ascii": dict(icon="open", status="Open", instructor="José Núñez", enrolled=24, waitlisted=0, available=6),
+}
+
+# Each edit strips one field process needs from an otherwise valid page
+BROKEN_PAGES = {
+    "no_shadowbox": (r'class="container shadowbox"', 'class="container"'),
+    "no_course_name": (r"<p><span>.*?</p>\s*<p class=\"institution\">.*?</p>", ""),
+    "no_class_number": (r"<td>Class Number</td>", "<td>Class</td>"),
+    "no_status_image": (r'title="Open"', 'title=""'),
+    "no_days_and_times": (r'data-label="Days And Times"', ""),
+    "no_room": (r'data-label="Room"', ""),
+    "no_instructor": (r'data-label="Instructor"', ""),
+    "no_meeting_dates": (r'data-label="Meeting Dates"', ""),
+    "no_availability_header": (r"<b>Class Availability</b>", ""),
+    "missing_seat_counts": (r"<span>6</span>", "6"),
+}
+
+
+def assert_same_error(html: str) -> None:
+    with pytest.raises(ValueError) as slow:
+        process(BeautifulSoup(html, "lxml"))
+    with pytest.raises(ValueError) as fast:
+        process_fast(html)
+    assert str(fast.value) == str(slow.value)
+
+
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_process_fast_matches_process(page: str) -> None:
+    html = PAGE.format(**PAGES[page])
+    details, availabilities = process_fast(html)
+    assert (details, availabilities) == process(BeautifulSoup(html, "lxml"))
+    assert details.course_number == "45123"
+    assert details.instructor == PAGES[page]["instructor"]
+    assert availabilities.status == PAGES[page]["status"]
+
+
+@pytest.mark.parametrize("page", CORPUS)
+def test_corpus_pages_match_expected(page: str) -> None:
+    # The parser benchmark only times these pages, so their expected results are checked here too
+    html = (CORPUS_DIR/page).read_text()
+    details, availabilities = process_fast(html)
+    assert (details, availabilities) == process(BeautifulSoup(html, "lxml"))
+    expected = json.loads((CORPUS_DIR/"expected.json").read_text())[page]
+    assert {"details": asdict(details), "availabilities": asdict(availabilities)} == expected
+
+
+@pytest.mark.parametrize("case", sorted(BROKEN_PAGES))
+def test_process_fast_raises_like_process(case: str) -> None:
+    pattern, replacement = BROKEN_PAGES[case]
+    html, count = re.subn(pattern, replacement, PAGE.format(**PAGES["open"]), count=1, flags=re.S)
+    assert count == 1
+    assert_same_error(html)
+
+
+@pytest.mark.parametrize("html", ["", "   ", "<html><body><form name='searchform'>Search criteria</form></body></html>"])
+def test_non_class_pages_raise_like_process(html: str) -> None:
+    assert_same_error(html)
+
+
+@pytest.mark.filterwarnings("ignore::bs4.XMLParsedAsHTMLWarning")
+def test_xml_declaration_is_parsed() -> None:
+    html = '<?xml version="1.0" encoding="UTF-8"?>\n' + PAGE.format(**PAGES["open"])
+    assert process_fast(html) == process(BeautifulSoup(html, "lxml"))
+
+
+LISTING_ROW = """<tr><td><a href="CFSearchToolController?class_number_searched={class_number_b64}">{link_text}</a></td>
+<td>{section}</td><td>{status_cell}</td></tr>"""
+
+
+def listing_page(*rows: tuple[str, str, str]) -> str:
+    cells = []
+    for class_number, section, status in rows:
+        status_cell = f'<img src="{status.lower()}.gif" title="{status}" alt="{status}"/>' if status else ""
+        cells.append(LISTING_ROW.format(
+            class_number_b64=b64encode(class_number.encode()).decode(),
+            link_text=class_number,
+            section=section,
+            status_cell=status_cell,
+        ))
+    return "<html><body><table class='classinfo'>" + "".join(cells) + "</table></body></html>"
+
+
+def test_process_listing_maps_class_numbers_to_status() -> None:
+    html = listing_page(
+        ("45123", "01-LEC Regular", "Open"),
+        ("45124", "02-LEC Regular", "Closed"),
+        ("45125", "03-LEC Regular", "Wait List"),
+        ("45126", "04-LAB Regular", ""),
+    )
+    # filter_by_listings compares these against course_details.course_number and the stored status
+    assert process_listing(html) == {"45123": "Open", "45124": "Closed", "45125": "Wait List"}
+
+
+def test_process_listing_falls_back_to_link_text() -> None:
+    html = listing_page(("45123", "01-LEC Regular", "Open")).replace(b64encode(b"45123").decode(), "not base64!")
+    assert process_listing(html) == {"45123": "Open"}
+
+
+@pytest.mark.parametrize("html", ["", "   ", "<html><body>No classes found</body></html>"])
+def test_process_listing_without_sections(html: str) -> None:
+    assert process_listing(html) == {}
+
+
+def test_process_listing_with_xml_declaration() -> None:
+    html = '<?xml version="1.0" encoding="UTF-8"?>\n' + listing_page(("45123", "01-LEC Regular", "Closed"))
+    assert process_listing(html) == {"45123": "Closed"}
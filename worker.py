@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from cuny_search.discord_bot import start_worker
+
+
+start_worker()
\ No newline at end of file